@@ -0,0 +1,211 @@
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.signals import setting_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils.encoding import force_text
+
+from .utils import (
+    get_model, get_resource_type, get_field_plan)
+
+
+def get_model_label(model):
+    return "{}.{}".format(model._meta.app_label, model._meta.object_name)
+
+
+class FragmentCache(object):
+    """
+    Cache of rendered resource objects, keyed by type, id and version.
+
+    Configured with the `FRAGMENT_CACHE` setting:
+
+    - `MODELS`: the cached models (as `app_label.ModelName`) mapped to the
+      name of their version field (e.g. `updated_at` or a version counter),
+      or to `None` to only rely on invalidation.
+    - `CACHE`: the alias of the Django cache backend (`"default"`).
+    - `TIMEOUT`: the timeout of the entries (the backend default if unset).
+
+    Each resource has one entry, holding its fragments for each serializer
+    and sparse fieldset (and `get_fragment_variant()` of the serializer)
+    along with their version. Entries are deleted when their instance is
+    saved, deleted or has its many-to-many relations changed.
+    """
+    key_prefix = "drf-jsonapi:fragments"
+
+    def __init__(self, config):
+        self.cache = caches[config.get("CACHE", "default")]
+        self.timeout = config.get("TIMEOUT", DEFAULT_TIMEOUT)
+        self.version_fields = dict(config["MODELS"])
+        self.key_format = getattr(settings, "REST_FRAMEWORK", {}).get(
+            "KEY_FORMAT", "dasherize")
+
+    def is_cached(self, model):
+        return get_model_label(model) in self.version_fields
+
+    def get_key(self, model, pk):
+        return "{}:{}:{}".format(
+            self.key_prefix, get_resource_type(model), force_text(pk))
+
+    def get_version_field(self, model):
+        """The version field of `model`, `None` if it isn't cached."""
+        return self.version_fields.get(get_model_label(model))
+
+    def get_version(self, instance, model):
+        version_field = self.version_fields[get_model_label(model)]
+        if version_field is None:
+            return None
+        return force_text(getattr(instance, version_field))
+
+    def get_variant(self, serializer):
+        """
+        The serializer and output options a fragment depends on, along with
+        the `get_fragment_variant()` of the serializer (e.g. for output
+        depending on the request).
+        """
+        fieldset = getattr(serializer, "sparse_fieldset", None)
+        variant = "{}.{}|{}|{}".format(
+            serializer.__class__.__module__, serializer.__class__.__name__,
+            ",".join(sorted(fieldset)) if fieldset is not None else "*",
+            self.key_format)
+        get_fragment_variant = getattr(
+            serializer, "get_fragment_variant", None)
+        extra = get_fragment_variant() if get_fragment_variant else None
+        if extra is not None:
+            variant = "{}|{}".format(variant, force_text(extra))
+        return variant
+
+    def get_many(self, instances):
+        """
+        Return the entries of `instances` with a single cache lookup, to be
+        given to `get`.
+        """
+        return self.cache.get_many([
+            self.get_key(get_model(instance), instance.pk)
+            for instance in instances])
+
+    def get(self, instance, serializer, entries=None):
+        """
+        Return the cached resource object of `instance`, if any, from
+        `entries` (see `get_many`) when given.
+        """
+        model = get_model(instance)
+        key = self.get_key(model, instance.pk)
+        if entries is not None:
+            entry = entries.get(key)
+        else:
+            entry = self.cache.get(key)
+        if not entry or entry["version"] != self.get_version(instance, model):
+            return None
+        return entry["fragments"].get(self.get_variant(serializer))
+
+    def set(self, instance, serializer, resource, entries=None):
+        self.set_many([(instance, serializer, resource, entries)])
+
+    def set_many(self, fragments):
+        """
+        Store `(instance, serializer, resource object, entries)` fragments
+        with a single cache write. `entries` are the ones read by `get_many`
+        along with the instance (`None` if unknown, read at once then).
+        """
+        keys = [self.get_key(get_model(instance), instance.pk)
+                for instance, serializer, resource, entries in fragments]
+        unknown = [key for key, fragment in zip(keys, fragments)
+                   if fragment[3] is None]
+        read = self.cache.get_many(unknown) if unknown else {}
+        updated = {}
+        for key, (instance, serializer, resource, entries) in zip(
+                keys, fragments):
+            version = self.get_version(instance, get_model(instance))
+            entry = updated.get(key) or \
+                (read if entries is None else entries).get(key)
+            if not entry or entry["version"] != version:
+                # Fragments of other versions are stale
+                entry = {"version": version, "fragments": {}}
+            entry["fragments"][self.get_variant(serializer)] = resource
+            updated[key] = entry
+        if updated:
+            self.cache.set_many(updated, self.timeout)
+
+    def invalidate(self, model, pks):
+        self.cache.delete_many([self.get_key(model, pk) for pk in pks])
+
+    def to_representation(self, resource, serializer):
+        """
+        Return the serialized data standing for a cached resource object:
+        its identification and relationships (all the adapter needs to
+        sideload related resources), the resource object being kept as
+        `_resource`.
+        """
+        ret = OrderedDict([
+            ("id", resource["id"]),
+            ("_drf_jsonapi_type", resource["type"]),
+        ])
+        relationships = resource.get("relationships", {})
+        for field_name, key, many in get_field_plan(serializer).relationships:
+            data = relationships.get(key, {}).get("data")
+            if many:
+                ret[field_name] = [
+                    self.related_representation(item) for item in data or []]
+            elif data:
+                ret[field_name] = self.related_representation(data)
+            else:
+                ret[field_name] = None
+        ret._resource = resource
+        return ret
+
+    def related_representation(self, data):
+        ret = OrderedDict([
+            ("id", data["id"]),
+            ("_drf_jsonapi_type", data["type"]),
+        ])
+        ret._is_related = True
+        return ret
+
+
+# The fragment cache of the settings, in a list to be built lazily
+_fragment_caches = []
+
+
+@receiver(setting_changed)
+def clear_fragment_cache(setting, **kwargs):
+    if setting == "REST_FRAMEWORK":
+        del _fragment_caches[:]
+
+
+def get_fragment_cache():
+    """Return the fragment cache, `None` unless the setting is defined."""
+    try:
+        return _fragment_caches[0]
+    except IndexError:
+        config = getattr(settings, "REST_FRAMEWORK", {}).get(
+            "FRAGMENT_CACHE")
+        cache = FragmentCache(config) if config else None
+        _fragment_caches[:] = [cache]
+        return cache
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_fragment(sender, instance, **kwargs):
+    cache = get_fragment_cache()
+    model = get_model(instance)
+    if cache is not None and cache.is_cached(model):
+        cache.invalidate(model, [instance.pk])
+
+
+@receiver(m2m_changed)
+def invalidate_related_fragments(sender, instance, action, reverse, model,
+                                 pk_set, **kwargs):
+    cache = get_fragment_cache()
+    if cache is None or action not in ("post_add", "post_remove",
+                                       "pre_clear"):
+        return
+    if cache.is_cached(get_model(instance)):
+        cache.invalidate(get_model(instance), [instance.pk])
+    # The other side of the relation (unknown on clear)
+    if pk_set and cache.is_cached(model):
+        cache.invalidate(model, pk_set)
@@ -0,0 +1,125 @@
+from __future__ import unicode_literals
+
+import datetime
+import decimal
+import uuid
+
+from django.conf import settings
+from django.utils import six
+from rest_framework.compat import importlib, SHORT_SEPARATORS, LONG_SEPARATORS
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_datetime(obj):
+    # Same output as DRF's encoder
+    representation = obj.isoformat()
+    if obj.microsecond:
+        representation = representation[:23] + representation[26:]
+    if representation.endswith("+00:00"):
+        representation = representation[:-6] + "Z"
+    return representation
+
+
+TYPE_HANDLERS = {
+    datetime.datetime: encode_datetime,
+    datetime.date: lambda obj: obj.isoformat(),
+    decimal.Decimal: float,
+    uuid.UUID: six.text_type,
+}
+
+
+class JsonApiEncoder(encoders.JSONEncoder):
+    """
+    DRF's encoder, looking the handlers of the most common types up by their
+    exact type before going through its `isinstance` chain.
+    """
+
+    def default(self, obj):
+        handler = TYPE_HANDLERS.get(type(obj))
+        if handler is not None:
+            return handler(obj)
+        return super(JsonApiEncoder, self).default(obj)
+
+
+def stdlib_backend(renderer):
+    encoder = JsonApiEncoder(
+        ensure_ascii=renderer.ensure_ascii, check_circular=False,
+        separators=SHORT_SEPARATORS if renderer.compact else LONG_SEPARATORS)
+
+    def dumps(data):
+        ret = encoder.encode(data)
+        if isinstance(ret, six.text_type):
+            # Keep the output a strict javascript subset, as DRF does
+            ret = ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+            return ret.encode("utf-8")
+        return ret
+    return dumps
+
+
+def orjson_backend(renderer):
+    default = JsonApiEncoder().default
+    # Datetimes go through `default` to keep DRF's format
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    fallback = stdlib_backend(renderer)
+
+    def dumps(data):
+        try:
+            ret = orjson.dumps(data, default=default, option=option)
+        except TypeError:
+            # What orjson doesn't support (e.g. integers over 64 bits)
+            return fallback(data)
+        # Keep the output a strict javascript subset, as DRF does
+        if b"\xe2\x80\xa8" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+        if b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+    return dumps
+
+
+ENCODER_BACKENDS = {
+    "stdlib": stdlib_backend,
+    "orjson": orjson_backend,
+}
+
+
+def get_encoder_backend(renderer, name=None):
+    """
+    Return the `dumps(data)` function, rendering `data` to a bytestring, of
+    the `name` backend (defaults to the `JSON_ENCODER_BACKEND` setting).
+
+    - `"auto"` (the default) uses `orjson` when it is installed and suitable
+      for the renderer options (unicode and compact output), else `"stdlib"`.
+    - `"stdlib"` uses the `json` module with a preconfigured encoder.
+    - `"orjson"` requires the `orjson` package.
+    - Any other value is the import path of a backend, called with the
+      renderer and returning a `dumps(data)` function.
+    """
+    if name is None:
+        name = getattr(settings, "REST_FRAMEWORK", {}).get(
+            "JSON_ENCODER_BACKEND", "auto")
+    if name == "auto":
+        if orjson is not None and not renderer.ensure_ascii and \
+                renderer.compact:
+            name = "orjson"
+        else:
+            name = "stdlib"
+    if name in ENCODER_BACKENDS:
+        backend = ENCODER_BACKENDS[name]
+    else:
+        try:
+            parts = name.split(".")
+            module_path, class_name = ".".join(parts[:-1]), parts[-1]
+            module = importlib.import_module(module_path)
+            backend = getattr(module, class_name)
+        except (ImportError, AttributeError) as e:
+            msg = ("Could not import '{}' for API setting "
+                   "'JSON_ENCODER_BACKEND'. {}: {}.".format(
+                       name, e.__class__.__name__, e))
+            raise ImportError(msg)
+    return backend(renderer)
@@ -0,0 +1,13 @@
+from __future__ import unicode_literals
+
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import ParseError
+
+
+class InvalidQueryParameter(ParseError):
+    """Error pointing to the query parameter which caused it."""
+    default_detail = _("Invalid query parameter.")
+
+    def __init__(self, parameter, detail=None):
+        super(InvalidQueryParameter, self).__init__(detail)
+        self.parameter = parameter
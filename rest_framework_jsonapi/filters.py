@@ -0,0 +1,123 @@
+from __future__ import unicode_literals
+
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import ugettext as _
+from rest_framework.filters import BaseFilterBackend
+
+from .exceptions import InvalidQueryParameter
+from .utils import get_lookup, get_lookup_field, get_sort
+
+
+class SortFilter(BaseFilterBackend):
+    """
+    Order the queryset by the JSONAPI `sort` query parameter (e.g.
+    `sort=-created,author.last-name`).
+
+    Sort fields must be listed in the `allowed_sorts` of the view, or else
+    match an index of the model (see `utils.get_sort`). The queryset keeps
+    its ordering when the parameter isn't set.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = get_sort(request, view, queryset.model)
+        if ordering is None:
+            return queryset
+        return queryset.order_by(*ordering)
+
+
+class FieldFilter(BaseFilterBackend):
+    """
+    Filter the queryset by the JSONAPI `filter` query parameters:
+
+    - `filter[title]=A` filters on `title` being `A`, and `filter[title]=A,B`
+      on `title` being either `A` or `B`.
+    - `filter[created][range]=2016-01-01,2016-02-01` applies the `range`
+      operator, and so on with the `OPERATORS`.
+
+    Values are converted by the model field (`to_python`), after the JSON
+    literals `true`, `false` and `null` (except for text fields).
+
+    Fields are formatted member names, `.` following to-one relationships
+    (e.g. `filter[author.last-name]=Davis`). They must be listed in the
+    `allowed_filters` of the view, mapping them to their allowed operators.
+    """
+    parameter_regex = re.compile(r"^filter\[([^\[\]]+)\](?:\[([^\[\]]+)\])?$")
+    # Operators and their number of values (`None` for any)
+    OPERATORS = {
+        "exact": 1,
+        "in": None,
+        "range": 2,
+        "lt": 1,
+        "lte": 1,
+        "gt": 1,
+        "gte": 1,
+    }
+    LITERALS = {"true": True, "false": False, "null": None}
+
+    def filter_queryset(self, request, queryset, view):
+        for parameter, lookup, value in self.get_filters(
+                request, queryset, view):
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, TypeError, ValidationError):
+                raise InvalidQueryParameter(parameter, _(
+                    "Invalid value '{value}'.").format(
+                        value=request.query_params[parameter]))
+        return queryset
+
+    def get_filters(self, request, queryset, view):
+        """
+        Return the `(parameter, lookup, value)` of the `filter` query
+        parameters, checked against the `allowed_filters` of the view.
+        """
+        allowed_filters = getattr(view, "allowed_filters", None) or {}
+        filters = []
+        for parameter in sorted(request.query_params):
+            if not parameter.startswith("filter["):
+                continue
+            match = self.parameter_regex.match(parameter)
+            if match is None:
+                raise InvalidQueryParameter(parameter, _(
+                    "Invalid filter parameter."))
+            field, operator = match.groups()
+            values = [value for item in request.query_params.getlist(
+                parameter) for value in item.split(",")]
+            if operator is None:
+                operator = "exact" if len(values) == 1 else "in"
+            if field not in allowed_filters or \
+                    operator not in allowed_filters[field]:
+                raise InvalidQueryParameter(parameter, _(
+                    "Filtering on '{field}' with '{operator}' is not "
+                    "allowed.").format(field=field, operator=operator))
+            lookup = get_lookup(field)
+            model_field = get_lookup_field(queryset.model, lookup)
+            if operator not in self.OPERATORS or model_field is None:
+                raise InvalidQueryParameter(parameter, _(
+                    "Filtering on '{field}' with '{operator}' is not "
+                    "supported.").format(field=field, operator=operator))
+            count = self.OPERATORS[operator]
+            if count is not None and len(values) != count:
+                raise InvalidQueryParameter(parameter, _(
+                    "'{operator}' expects {count} value(s).").format(
+                        operator=operator, count=count))
+            try:
+                values = [self.to_python(model_field, value)
+                          for value in values]
+            except ValidationError:
+                raise InvalidQueryParameter(parameter, _(
+                    "Invalid value '{value}'.").format(
+                        value=request.query_params[parameter]))
+            filters.append((parameter, "{}__{}".format(lookup, operator),
+                            values[0] if count == 1 else values))
+        return filters
+
+    def to_python(self, model_field, value):
+        """Convert a filter value with the model field."""
+        if not isinstance(model_field, (models.CharField, models.TextField)):
+            value = self.LITERALS.get(value, value)
+        if value is None:
+            return None
+        return model_field.to_python(value)
@@ -0,0 +1,407 @@
+from __future__ import unicode_literals
+
+import calendar
+import hashlib
+
+from django.db.models import Prefetch, Count, Max
+from django.http import StreamingHttpResponse, HttpResponseNotModified
+from django.utils import six
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.translation import ugettext as _
+from rest_framework.pagination import CursorPagination
+from rest_framework.relations import RelatedField, ManyRelatedField
+from rest_framework.response import Response
+
+from .exceptions import InvalidQueryParameter
+from .renderers import JsonApiRenderer
+from .utils import (
+    prefetch_related_objects, get_serializer, get_included_serializer,
+    get_include_tree, get_model_field, is_to_many, is_polymorphic, format_key,
+    get_sparse_fieldsets, get_deferred_fields, get_resource_type)
+
+
+class IncludeBudgetMixin(object):
+    """
+    Bound what a single request can sideload.
+
+    - `allowed_includes`: the formatted paths that can be included, along
+      with their intermediate paths. Any path is allowed when `None`.
+    - `max_include_depth`: the maximum number of relations in a path.
+    - `max_included`: the maximum number of resources fetched to be
+      included (intermediate resources of a path included), checked before
+      each batch of included resources is fetched.
+
+    Invalid `include` parameters are rejected before any query is run. When
+    `max_included` applies, the document is built by the view before it's
+    rendered, so that exceeding it is handled as any other view error.
+    """
+    allowed_includes = None
+    max_include_depth = None
+    max_included = None
+
+    def initial(self, request, *args, **kwargs):
+        super(IncludeBudgetMixin, self).initial(request, *args, **kwargs)
+        self.check_include(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = self.build_document(request, response)
+        return super(IncludeBudgetMixin, self).finalize_response(
+            request, response, *args, **kwargs)
+
+    def build_document(self, request, response):
+        """
+        Build the JSONAPI document of `response` within `max_included`, to be
+        rendered as is. Return the error response when it's exceeded.
+        """
+        renderer = getattr(request, "accepted_renderer", None)
+        if self.max_included is None or \
+                not isinstance(response, Response) or \
+                getattr(response, "exception", False) or \
+                not isinstance(renderer, JsonApiRenderer) or \
+                not get_include_tree(request):
+            return response
+        renderer = type(renderer)()
+        renderer.view, renderer.request = self, request
+        try:
+            response.jsonapi_document = renderer.get_hash(
+                response.data, max_included=self.max_included)
+        except InvalidQueryParameter as exc:
+            return self.handle_exception(exc)
+        return response
+
+    def get_allowed_includes(self):
+        if self.allowed_includes is None:
+            return None
+        allowed = set()
+        for path in self.allowed_includes:
+            path = path.split(".")
+            for depth in range(1, len(path) + 1):
+                allowed.add(".".join(path[:depth]))
+        return allowed
+
+    def check_include(self, request):
+        allowed = self.get_allowed_includes()
+        for path in get_include_tree(request).paths():
+            if self.max_include_depth is not None and \
+                    len(path) > self.max_include_depth:
+                raise InvalidQueryParameter("include", _(
+                    "Include path '{path}' exceeds the maximum depth of "
+                    "{depth}.").format(path=".".join(path),
+                                       depth=self.max_include_depth))
+            if allowed is not None and ".".join(path) not in allowed:
+                raise InvalidQueryParameter("include", _(
+                    "Including '{path}' is not allowed.").format(
+                        path=".".join(path)))
+
+
+class PrefetchIncludedMixin(object):
+    """
+    Plan the related lookups of the queryset from the `include` query
+    parameter, so that sideloaded data is fetched along with primary data.
+
+    To-one paths are followed with `select_related` and to-many (or
+    polymorphic) paths with `Prefetch` objects. Paths that the serializers
+    can't include, or that sparse fieldsets leave out, are ignored. Columns
+    left out by sparse fieldsets are deferred.
+    """
+
+    def get_queryset(self):
+        queryset = super(PrefetchIncludedMixin, self).get_queryset()
+        select_related, prefetch_related, deferred = self.get_include_plan(
+            queryset.model)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+    def get_include_plan(self, model):
+        serializer = get_serializer(self.get_serializer_class()())
+        tree = self.resolve_include_tree(
+            get_include_tree(self.request), model, serializer)
+        return self.plan_include_tree(tree)
+
+    def resolve_include_tree(self, include_tree, model, serializer):
+        """
+        Resolve the include tree against the serializers and return the
+        matching model relations as a nested dict of
+        `{lookup: (related model, needs prefetch, deferred fields, subtree)}`.
+        """
+        tree = {}
+        if not include_tree:
+            return tree
+        fieldsets = get_sparse_fieldsets(self.request)
+        fieldset = fieldsets.get(get_resource_type(model))
+        for field_name, field in six.iteritems(serializer.get_fields()):
+            key = format_key(field_name)
+            node = include_tree.get(key)
+            if node is None or \
+                    not isinstance(field, (RelatedField, ManyRelatedField)) \
+                    or fieldset is not None and key not in fieldset:
+                continue
+            included_serializer = get_included_serializer(
+                serializer, field_name)
+            model_field = get_model_field(model, field.source or field_name)
+            if not included_serializer or model_field is None or \
+                    not model_field.is_relation:
+                continue
+            related_model = model_field.related_model
+            to_many = is_to_many(model_field)
+            # Prefetch lookups use the accessor, select_related the field name
+            if to_many:
+                lookup = field.source or field_name
+            else:
+                lookup = model_field.name
+            # Polymorphic instances are only downcasted by their own manager
+            polymorphic = is_polymorphic(related_model)
+            related_fieldset = fieldsets.get(get_resource_type(related_model))
+            deferred = []
+            if related_fieldset is not None and not polymorphic and \
+                    hasattr(included_serializer, "sparse_fieldset"):
+                deferred = get_deferred_fields(
+                    included_serializer.__class__, related_fieldset)
+            tree[lookup] = (
+                related_model, to_many or polymorphic, deferred,
+                self.resolve_include_tree(
+                    node, related_model, included_serializer))
+        return tree
+
+    def plan_include_tree(self, tree):
+        """
+        Return the `select_related` lookups, `Prefetch` objects and deferred
+        fields of a resolved include tree.
+        """
+        select_related, prefetch_related, deferred = [], [], []
+        for name, (model, prefetch, fields, subtree) in sorted(tree.items()):
+            sub_select, sub_prefetch, sub_deferred = self.plan_include_tree(
+                subtree)
+            if prefetch:
+                queryset = model._default_manager.all()
+                if sub_select:
+                    queryset = queryset.select_related(*sub_select)
+                if sub_prefetch:
+                    queryset = queryset.prefetch_related(*sub_prefetch)
+                if fields or sub_deferred:
+                    queryset = queryset.defer(*(fields + sub_deferred))
+                prefetch_related.append(Prefetch(name, queryset=queryset))
+                continue
+            select_related.append(name)
+            select_related.extend(
+                "__".join([name, lookup]) for lookup in sub_select)
+            prefetch_related.extend(
+                Prefetch("__".join([name, prefetch.prefetch_through]),
+                         queryset=prefetch.queryset)
+                for prefetch in sub_prefetch)
+            deferred.extend(
+                "__".join([name, field]) for field in fields + sub_deferred)
+        return select_related, prefetch_related, deferred
+
+
+class SparseFieldsetsMixin(object):
+    """
+    Defer the model columns that only back the fields left out by the
+    `fields[TYPE]` query parameter of the primary data type.
+    """
+
+    def get_queryset(self):
+        queryset = super(SparseFieldsetsMixin, self).get_queryset()
+        serializer = get_serializer(self.get_serializer())
+        if hasattr(serializer, "get_deferred_fields"):
+            deferred = serializer.get_deferred_fields()
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
+
+
+class ValuesListMixin(object):
+    """
+    Serve the `list` action from `QuerySet.values()` rows when the serializer
+    opts in with `Meta.read_from_values = True`.
+
+    Rows are serialized straight from their columns, without instantiating
+    models nor going through each field. The regular path is used when a
+    field isn't a plain model column or a to-one
+    `JsonApiPrimaryKeyRelatedField`, or with cursor pagination.
+    """
+
+    def list(self, request, *args, **kwargs):
+        serializer = get_serializer(self.get_serializer())
+        plan = getattr(serializer, "get_values_plan", lambda: None)()
+        if plan is None or isinstance(self.paginator, CursorPagination):
+            return super(ValuesListMixin, self).list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        # Related lookups can't be followed from rows
+        queryset = queryset.select_related(None).prefetch_related(None)
+        queryset = queryset.values(*plan.columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+
+def strip_weak_etag(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+class ConditionalGetMixin(object):
+    """
+    Answer `GET` requests of the `list` and `retrieve` actions with `304 Not
+    Modified` when the client's copy is up to date, before any serialization.
+
+    The validators are computed from a single aggregate query on the
+    (filtered) queryset: the number of objects and the latest value of
+    `last_modified_field` (e.g. a `DateTimeField(auto_now=True)`, or `None`
+    to only count objects). The `ETag` also depends on the normalized query
+    parameters (`include`, `fields[TYPE]`, pagination...) and the accepted
+    media type. Changes of included resources aren't tracked.
+    """
+    last_modified_field = "updated_at"
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            request, self.filter_queryset(self.get_queryset()),
+            super(ConditionalGetMixin, self).list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{
+            self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return self.get_conditional_response(
+            request, queryset, super(ConditionalGetMixin, self).retrieve,
+            *args, **kwargs)
+
+    def check_not_modified(self, request):
+        """
+        Called before answering `304 Not Modified`. Detail views look the
+        object up, which checks its permissions (and raises `404` if it
+        doesn't exist).
+        """
+        if (self.lookup_url_kwarg or self.lookup_field) in self.kwargs:
+            self.get_object()
+
+    def get_conditional_response(self, request, queryset, handler, *args,
+                                 **kwargs):
+        count, last_modified = self.get_validators(queryset)
+        etag = self.get_etag(request, count, last_modified)
+        if last_modified is not None:
+            # HTTP dates have a one second resolution
+            last_modified = calendar.timegm(last_modified.utctimetuple())
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if_modified_since = parse_http_date_safe(
+            request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                # Any current representation, i.e. any object
+                not_modified = count > 0
+            else:
+                # Weak comparison (RFC 7232)
+                not_modified = strip_weak_etag(etag) in [
+                    strip_weak_etag(tag.strip())
+                    for tag in if_none_match.split(",")]
+        else:
+            not_modified = last_modified is not None and \
+                if_modified_since is not None and \
+                last_modified <= if_modified_since
+        if not_modified:
+            self.check_not_modified(request)
+            response = HttpResponseNotModified()
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def get_validators(self, queryset):
+        """
+        Return the number of objects and the date of the last modification
+        (`None` if unknown), with a single query.
+        """
+        aggregates = {"count": Count("pk")}
+        if self.last_modified_field:
+            aggregates["last_modified"] = Max(self.last_modified_field)
+        # The ordering is irrelevant to aggregates
+        result = queryset.order_by().aggregate(**aggregates)
+        return result["count"], result.get("last_modified")
+
+    def get_normalized_params(self, request):
+        """
+        Return the query parameters as sorted `(name, value)` pairs, the
+        order of the `include` paths and sparse fieldsets being irrelevant.
+        """
+        params = []
+        for name, values in request.query_params.lists():
+            for value in values:
+                if name == "include" or name.startswith("fields["):
+                    value = ",".join(sorted(value.split(",")))
+                params.append((name, value))
+        return sorted(params)
+
+    def get_etag(self, request, count, last_modified):
+        validator = "|".join([
+            request.path, force_text(count), force_text(last_modified),
+            force_text(getattr(request, "accepted_media_type", "")),
+            "&".join("=".join(param)
+                     for param in self.get_normalized_params(request))])
+        return quote_etag(hashlib.md5(force_bytes(validator)).hexdigest())
+
+
+class StreamingListMixin(object):
+    """
+    Stream list responses with `StreamingHttpResponse`. Responses with a
+    bounded number of included resources (`IncludeBudgetMixin`) aren't
+    streamed.
+
+    Primary data is read through `QuerySet.iterator()` and serialized by
+    chunks of `stream_chunk_size` objects, each chunk being rendered as soon
+    as it's serialized. Lookups of `prefetch_related` are run per chunk.
+    `included` and the pagination members are rendered at the end.
+    """
+    stream_chunk_size = 100
+    stream_renderer_class = JsonApiRenderer
+
+    def list(self, request, *args, **kwargs):
+        if getattr(self, "max_included", None) is not None and \
+                get_include_tree(request):
+            # The included resources are counted before rendering
+            return super(StreamingListMixin, self).list(
+                request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        document = None
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            instances = page
+            paginated = self.get_paginated_response([]).data
+            if isinstance(paginated, dict):
+                document = paginated
+                document.pop("data")
+        else:
+            instances = queryset.iterator()
+        renderer = self.stream_renderer_class()
+        return StreamingHttpResponse(renderer.render_stream(
+            self.get_serialized_chunks(queryset, instances),
+            self.get_serializer(), document,
+            self.get_renderer_context()), content_type=renderer.media_type)
+
+    def get_serialized_chunks(self, queryset, instances):
+        prefetch_lookups = getattr(queryset, "_prefetch_related_lookups", ())
+        chunk = []
+        for instance in instances:
+            chunk.append(instance)
+            if len(chunk) < self.stream_chunk_size:
+                continue
+            yield self.serialize_chunk(chunk, prefetch_lookups)
+            chunk = []
+        if chunk:
+            yield self.serialize_chunk(chunk, prefetch_lookups)
+
+    def serialize_chunk(self, chunk, prefetch_lookups):
+        if prefetch_lookups:
+            prefetch_related_objects(chunk, *prefetch_lookups)
+        return self.get_serializer(chunk, many=True).data
@@ -1,17 +1,201 @@
 from __future__ import unicode_literals
 
+import hashlib
+import json
+
 from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page as DjangoPage
+from django.db import connections
+from django.db.models import Q
+from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.translation import ugettext as _
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.pagination import (
     PageNumberPagination as DrfPageNumberPagination,
     LimitOffsetPagination as DrfLimitOffsetPagination,
-    CursorPagination as DrfCursorPagination
+    CursorPagination as DrfCursorPagination,
+    Cursor, DjangoPaginator, _get_count, _reverse_ordering
 )
 
+from .exceptions import InvalidQueryParameter
+from .utils import get_sort, get_sort_field
+
+
+COUNT_MODES = ("exact", "cached", "estimated", "none")
+
+
+class CountMixin(object):
+    """
+    Count the paginated objects according to a count mode:
+
+    - `"exact"`: `SELECT COUNT(*)`.
+    - `"cached"`: the exact count, cached for `count_cache_timeout` seconds
+      in the `count_cache` backend, keyed by the SQL of the queryset.
+    - `"estimated"`: the row estimate of the database planner (PostgreSQL
+      only), or the exact count when it is below `estimate_threshold` or
+      can't be estimated.
+    - `"none"`: no count.
+
+    The mode is the `count_mode` of the view, else of the pagination, else
+    the `PAGINATION_COUNT_MODE` setting (`"exact"` by default).
+    """
+    count_mode = None
+    count_cache = "default"
+    count_cache_timeout = 60
+    estimate_threshold = 1000
+
+    def get_count_mode(self, view):
+        count_mode = getattr(view, "count_mode", None) or \
+            self.count_mode or \
+            getattr(settings, "REST_FRAMEWORK", {}).get(
+                "PAGINATION_COUNT_MODE", "exact")
+        if count_mode not in COUNT_MODES:
+            raise ValueError(
+                "Invalid count mode '{}'. Valid values are 'exact', "
+                "'cached', 'estimated' and 'none'.".format(count_mode))
+        return count_mode
+
+    def get_count(self, queryset, view):
+        """
+        Return the `(count, exact)` of `queryset`, `count` being `None` when
+        the objects aren't counted and `exact` telling whether it was just
+        counted.
+        """
+        count_mode = self.get_count_mode(view)
+        if count_mode == "none":
+            return None, False
+        if not hasattr(queryset, "query") or count_mode == "exact":
+            return _get_count(queryset), True
+        if count_mode == "cached":
+            return self.get_cached_count(queryset)
+        count = self.get_estimated_count(queryset)
+        if count is None or count < self.estimate_threshold:
+            return _get_count(queryset), True
+        return count, False
+
+    def get_count_key(self, queryset):
+        # The SQL of the count, whatever the ordering and selected columns
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        return "drf-jsonapi:counts:{}".format(hashlib.md5(force_bytes(
+            "{}|{}".format(sql, params))).hexdigest())
+
+    def get_cached_count(self, queryset):
+        cache = caches[self.count_cache]
+        key = self.get_count_key(queryset)
+        count = cache.get(key)
+        if count is not None:
+            return count, False
+        count = _get_count(queryset)
+        cache.set(key, count, self.count_cache_timeout)
+        return count, True
+
+    def get_estimated_count(self, queryset):
+        """Return the row estimate of the planner, `None` if unsupported."""
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) {}".format(sql), params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, six.string_types):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
 
-class PageNumberPagination(DrfPageNumberPagination):
+class Page(DjangoPage):
+    # Whether there is a next page, when it isn't told by the count
+    next_page = None
+
+    def has_next(self):
+        if self.next_page is not None:
+            return self.next_page
+        return super(Page, self).has_next()
+
+
+class Paginator(DjangoPaginator):
+    """
+    Paginator given its count. When the count isn't exact (or missing),
+    page numbers aren't checked against it and each page fetches one more
+    object to tell whether there is a next page.
+    """
+
+    def __init__(self, object_list, per_page, count, exact):
+        super(Paginator, self).__init__(object_list, per_page)
+        self.known_count = count
+        self.exact = exact
+
+    @property
+    def count(self):
+        return self.known_count
+
+    def validate_number(self, number):
+        if self.exact:
+            return super(Paginator, self).validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super(Paginator, self).validate_number(number)
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if self.exact:
+            return super(Paginator, self).page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage("That page contains no results")
+        page = self._get_page(object_list[:self.per_page], number, self)
+        page.next_page = len(object_list) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return Page(*args, **kwargs)
+
+
+class PageNumberPagination(CountMixin, DrfPageNumberPagination):
     page_query_param = "page[number]"
+    django_paginator_class = Paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            # The last page is only known from an exact count
+            count, exact = _get_count(queryset), True
+        else:
+            count, exact = self.get_count(queryset, view)
+        paginator = self.django_paginator_class(
+            queryset, page_size, count, exact)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=six.text_type(exc)
+            )
+            raise NotFound(msg)
+
+        if exact and paginator.num_pages > 1 and self.template is not None:
+            # The browsable API should display pagination controls.
+            self.display_page_controls = True
+
+        self.request = request
+        return list(self.page)
 
     def get_first_link(self):
         url = self.request.build_absolute_uri()
@@ -19,6 +203,10 @@ class PageNumberPagination(DrfPageNumberPagination):
 
     def get_last_link(self):
         url = self.request.build_absolute_uri()
+        if not self.page.paginator.exact:
+            # Resolved with an exact count when followed
+            return replace_query_param(
+                url, self.page_query_param, self.last_page_strings[0])
         page_number = self.page.paginator.num_pages
         return replace_query_param(url, self.page_query_param, page_number)
 
@@ -27,42 +215,229 @@ class PageNumberPagination(DrfPageNumberPagination):
         next_link = self.get_next_link()
         if not prev_link and not next_link:
             return Response(data)
-        return Response(OrderedDict([
+        ret = OrderedDict([
             ("links", OrderedDict([
                 ("first", self.get_first_link()),
                 ("last", self.get_last_link()),
                 ("prev", prev_link),
                 ("next", next_link)])),
-            ("meta", OrderedDict([
+        ])
+        if self.page.paginator.count is not None:
+            ret["meta"] = OrderedDict([
                 ("count", self.page.paginator.count),
-                ("total-pages", self.page.paginator.num_pages)])),
-            ("data", data)
-        ]))
+                ("total-pages", self.page.paginator.num_pages)])
+        ret["data"] = data
+        return Response(ret)
 
 
-class LimitOffsetPagination(DrfLimitOffsetPagination):
+class LimitOffsetPagination(CountMixin, DrfLimitOffsetPagination):
     limit_query_param = "page[limit]"
     offset_query_param = "page[offset]"
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.count, self.exact = self.get_count(queryset, view)
+        self.request = request
+        if self.exact and self.count > self.limit and \
+                self.template is not None:
+            self.display_page_controls = True
+        if self.exact:
+            return list(queryset[self.offset:self.offset + self.limit])
+        # One more object tells whether there is a next page
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.next_page = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if not self.exact:
+            if not self.next_page:
+                return None
+            url = self.request.build_absolute_uri()
+            url = replace_query_param(url, self.limit_query_param, self.limit)
+            offset = self.offset + self.limit
+            return replace_query_param(url, self.offset_query_param, offset)
+        return super(LimitOffsetPagination, self).get_next_link()
+
     def get_paginated_response(self, data):
         prev_link = self.get_previous_link()
         next_link = self.get_next_link()
         if not prev_link and not next_link:
             return Response(data)
-        return Response(OrderedDict([
+        ret = OrderedDict([
             ("links", OrderedDict([
                 ("prev", prev_link),
                 ("next", next_link)])),
-            ("meta", OrderedDict([
-                ("count", self.count)])),
-            ("data", data)
-        ]))
+        ])
+        if self.count is not None:
+            ret["meta"] = OrderedDict([
+                ("count", self.count)])
+        ret["data"] = data
+        return Response(ret)
 
 
 class CursorPagination(DrfCursorPagination):
+    """
+    Keyset pagination, ordered by the `sort` query parameter (see
+    `utils.get_sort`) or else by `ordering`.
+
+    The primary key is appended to the ordering unless it ends with a
+    unique column, so that each object has its own position: the cursor
+    holds the values of the ordering columns of the object the page starts
+    after (or ends before), and pages are read with a `WHERE` clause on
+    those columns instead of an offset.
+    """
     cursor_query_param = "page[cursor]"
     ordering = "id"
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        try:
+            if position is not None:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(position, reverse))
+            # One more object tells whether there is a following page
+            results = list(queryset[:self.page_size + 1])
+        except (ValueError, TypeError, ValidationError):
+            # Positions that don't fit the ordering columns
+            raise NotFound(self.invalid_cursor_message)
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = \
+                position is not None, has_following
+        else:
+            self.has_next, self.has_previous = \
+                has_following, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        if not any(hasattr(backend, "get_ordering")
+                   for backend in getattr(view, "filter_backends", [])):
+            ordering = get_sort(request, view, queryset.model)
+            if ordering is not None:
+                for lookup in ordering:
+                    if get_sort_field(queryset.model, lookup).null:
+                        raise InvalidQueryParameter("sort", _(
+                            "Sorting by '{field}' is not supported.").format(
+                                field=lookup.lstrip("-")))
+        if ordering is None:
+            ordering = super(CursorPagination, self).get_ordering(
+                request, queryset, view)
+        return self.add_tie_breaker(queryset.model, ordering)
+
+    def add_tie_breaker(self, model, ordering):
+        model_field = get_sort_field(model, ordering[-1])
+        if model_field is not None and model_field.unique:
+            return ordering
+        prefix = "-" if ordering[-1].startswith("-") else ""
+        return tuple(ordering) + (prefix + "pk",)
+
+    def get_keyset_filter(self, position, reverse):
+        """
+        Filter the objects following `position` in the ordering (preceding
+        it if `reverse`): `(a > x) OR (a = x AND b > y) OR ...`.
+        """
+        keyset = Q()
+        for index, lookup in enumerate(self.ordering):
+            descending = lookup.startswith("-")
+            operator = "lt" if descending != reverse else "gt"
+            condition = dict(
+                (previous.lstrip("-"), position[previous_index])
+                for previous_index, previous in enumerate(
+                    self.ordering[:index]))
+            condition["{}__{}".format(lookup.lstrip("-"), operator)] = \
+                position[index]
+            keyset |= Q(**condition)
+        return keyset
+
+    def decode_cursor(self, request):
+        cursor = super(CursorPagination, self).decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        if len(self.ordering) == 1:
+            # Same cursors as DRF's
+            position = [cursor.position]
+        else:
+            try:
+                position = json.loads(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering) or \
+                not all(value is None or isinstance(value, six.string_types)
+                        for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[-1], self.ordering)
+        else:
+            position = self.encode_position(self.cursor.position)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[0], self.ordering)
+        else:
+            position = self.encode_position(self.cursor.position)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for lookup in ordering:
+            value = instance
+            for name in lookup.lstrip("-").split("__"):
+                value = getattr(value, name)
+            position.append(self.encode_value(value))
+        return self.encode_position(position)
+
+    def encode_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, float):
+            # `unicode(float)` keeps 12 significant digits on Python 2
+            return repr(value)
+        return six.text_type(value)
+
+    def encode_position(self, position):
+        if len(position) == 1:
+            return position[0]
+        return json.dumps(position)
+
     def get_paginated_response(self, data):
         prev_link = self.get_previous_link()
         next_link = self.get_next_link()
@@ -1,226 +1,480 @@
 from __future__ import unicode_literals
 
+import sys
 from collections import OrderedDict
 from django.utils import six
 from django.utils.encoding import force_text
+from django.utils.translation import ugettext as _
 
 from rest_framework.renderers import JSONRenderer
-from rest_framework.relations import RelatedField, ManyRelatedField
-from inflection import dasherize
-import re
 
-from .utils import get_serializer, import_serializer
+from .cache import get_fragment_cache
+from .encoders import get_encoder_backend
+from .exceptions import InvalidQueryParameter
+from .utils import (
+    get_serializer, get_included_serializer, get_include_tree, get_field_plan,
+    get_sparse_fieldsets, get_resource_type, is_polymorphic)
 
 
 class JsonApiRenderer(JSONRenderer):
     media_type = "application/vnd.api+json"
+    # Defaults to the `JSON_ENCODER_BACKEND` setting
+    encoder_backend = None
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         """Convert serialized response data to JSONAPI"""
         self.view = renderer_context.get("view", None)
         self.request = renderer_context.get("request", None)
+        # Documents built by the view before rendering (`IncludeBudgetMixin`)
+        document = getattr(
+            renderer_context.get("response"), "jsonapi_document", None)
         if getattr(self.view, 'is_errored', False):
             self.hash = data
+        elif document is not None:
+            self.hash = document
         else:
-            if self.view and hasattr(self.view, 'action') and \
-               self.view.action == 'list':
-                if isinstance(data, (dict, OrderedDict)) and "data" in data:
-                    # Pagination is present
-                    adapter_hash = JsonApiAdapter(
-                        self, data.pop("data")).serializable_hash()
-                    self.hash = data
-                    self.hash["jsonapi"] = adapter_hash.pop("jsonapi")
-                    self.hash["data"] = adapter_hash.pop("data")
-                    if "included" in adapter_hash:
-                        self.hash["included"] = adapter_hash.pop("included")
-                else:
-                    self.hash = JsonApiAdapter(self, data).serializable_hash()
-            else:
-                if hasattr(data, "serializer"):
-                    self.hash = JsonApiAdapter(self, data).serializable_hash()
-                else:
-                    self.hash = data
+            self.hash = self.get_hash(data)
+
+        if self.hash is None:
+            return bytes()
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super(JsonApiRenderer, self).render(
+                data=self.hash, accepted_media_type=accepted_media_type,
+                renderer_context=renderer_context)
+        return self.render_member(self.hash)
+
+    def render_stream(self, chunks, serializer, document=None,
+                      renderer_context=None):
+        """
+        Render a list document piece by piece, as a generator of bytestrings.
+
+        Resource objects are rendered as soon as each chunk of `chunks` (lists
+        of serialized data) is serialized. `included` and the other members
+        of `document` (e.g. pagination `links` and `meta`) come last.
+        """
+        renderer_context = renderer_context or {}
+        self.view = renderer_context.get("view", None)
+        self.request = renderer_context.get("request", None)
+        adapter = JsonApiAdapter(self, None, serializer=serializer)
+        yield b'{"jsonapi":' + self.render_member(adapter.hash["jsonapi"]) + \
+            b',"data":['
+        for index, resource in enumerate(adapter.stream_resources(chunks)):
+            yield (b"," if index else b"") + self.render_member(resource)
+        yield b"]"
+        members = OrderedDict(document or {})
+        included = adapter.get_streamed_included()
+        if included is not None:
+            members["included"] = included
+        for name, value in six.iteritems(members):
+            yield b',"' + name.encode("utf-8") + b'":' + \
+                self.render_member(value)
+        yield b"}"
 
-        return super(JsonApiRenderer, self).render(
-            data=self.hash, accepted_media_type=accepted_media_type,
-            renderer_context=renderer_context)
+    def render_member(self, data):
+        if not hasattr(self, "_dumps"):
+            self._dumps = get_encoder_backend(self, self.encoder_backend)
+        return self._dumps(data)
+
+    def get_hash(self, data, max_included=None):
+        """
+        Return the JSONAPI document of `data`. `max_included` bounds the
+        number of included resources, see `JsonApiAdapter`.
+        """
+        if self.view and hasattr(self.view, 'action') and \
+           self.view.action == 'list':
+            if isinstance(data, (dict, OrderedDict)) and "data" in data:
+                # Pagination is present, render into a copy of its document
+                document = OrderedDict(data)
+                return JsonApiAdapter(
+                    self, document.pop("data"), document=document,
+                    max_included=max_included).serializable_hash()
+            return JsonApiAdapter(
+                self, data, max_included=max_included).serializable_hash()
+        if hasattr(data, "serializer"):
+            return JsonApiAdapter(
+                self, data, max_included=max_included).serializable_hash()
+        return data
 
 
 class JsonApiAdapter(object):
-    def __init__(self, renderer, serialized_data, serializer=None):
+    # Mapping type of the rendered objects, dicts keep their insertion order
+    # from Python 3.7 and are cheaper to build and encode
+    dict_class = dict if sys.version_info >= (3, 7) else OrderedDict
+
+    def __init__(self, renderer, serialized_data, serializer=None,
+                 document=None, max_included=None):
         self.renderer = renderer
-        self.serialized_data = serialized_data
+        # Maximum number of included resources, `InvalidQueryParameter` is
+        # raised before fetching a batch that would exceed it
+        self.max_included = max_included
         if serializer:
             self.serializer = get_serializer(serializer)
         else:
             self.serializer = get_serializer(serialized_data.serializer)
-        self.hash = OrderedDict([
-            ("jsonapi", OrderedDict([("version", "1.0")])),
-            ("data", [])
-        ])
-        self.included_set = set()
+            if isinstance(serialized_data, dict):
+                # `Serializer.data` copies the representation into a
+                # `ReturnDict`, losing its attributes (e.g. the cached
+                # resource object)
+                serialized_data = getattr(
+                    serialized_data.serializer, "_data", serialized_data)
+        self.serialized_data = serialized_data
+        # Resources are written straight into `document` (e.g. the
+        # pagination payload) when given
+        self.hash = document if document is not None else self.dict_class()
+        self.hash["jsonapi"] = self.dict_class([("version", "1.0")])
+        # Identity map of the document resources, keyed by (type, id)
+        self.resources = {}
+        # Keys of the resources already rendered as primary or included data
+        self.rendered_keys = set()
+        # Concrete types of the objects related through polymorphic included
+        # serializers, keyed by (base model, id)
+        self.linkage_types = {}
+        # Resource objects to cache, see `save_fragments`
+        self.fragments = []
+        self.included_count = 0
 
     def serializable_hash(self):
+        self.resolve_linkage_types(
+            self.serialized_data if isinstance(self.serialized_data, list)
+            else [self.serialized_data], self.serializer)
         if isinstance(self.serialized_data, list):
-            for obj in self.serialized_data:
-                result = JsonApiAdapter(self.renderer, obj,
-                                        self.serializer).serializable_hash()
-                self.hash["data"].append(result.get("data"))
-                if result.get("included"):
-                    if "included" not in self.hash:
-                        self.hash["included"] = []
-                    for result in result.get("included"):
-                        set_key = "-".join([result.get("type"),
-                                            result.get("id")])
-                        if set_key not in self.included_set:
-                            self.hash["included"].append(result)
-                            self.included_set.add(set_key)
+            self.hash["data"] = [self.add_resource(obj, self.serializer)
+                                 for obj in self.serialized_data]
         else:
-            self.hash["data"] = self.attributes_for_serialized_data(
+            self.hash["data"] = self.add_resource(
                 self.serialized_data, self.serializer)
-            self.add_resource_relationships(
-                self.hash["data"], self.serialized_data, self.serializer)
+        self.rendered_keys.update(self.resources)
+        self.add_included(self.serialized_data, self.serializer,
+                          get_include_tree(self.renderer.request))
+        self.save_fragments()
         return self.hash
 
-    def add_relationships(self, resource, rel_name, relationship):
-        dash_name = dasherize(rel_name)
-        if dash_name not in resource["relationships"]:
-            resource["relationships"][dash_name] = OrderedDict({
-                "data": []
-            })
-        if relationship.get("data"):
-            for data in relationship.get("data"):
-                resource["relationships"][dash_name]["data"].append(
-                    OrderedDict([
-                        ("id", force_text(data.get("id"))),
-                        ("type", data.get("_drf_jsonapi_type")),
-                    ])
-                )
-
-    def add_relationship(self, resource, rel_name, relationship):
-        dash_name = dasherize(rel_name)
-        if dash_name not in resource["relationships"]:
-            resource["relationships"][dash_name] = OrderedDict({
-                "data": None
-            })
-        data = relationship.get("data")
+    def stream_resources(self, chunks):
+        """
+        Yield the primary resource objects of each chunk of serialized data,
+        sideloading their relationships chunk by chunk. Primary resources
+        aren't kept in the identity map so that memory stays flat.
+        """
+        include_tree = get_include_tree(self.renderer.request)
+        self.primary_keys = set()
+        for serialized_data in chunks:
+            self.resolve_linkage_types(serialized_data, self.serializer)
+            for obj in serialized_data:
+                resource = self.build_resource(obj, self.serializer)
+                key = (resource["type"], resource["id"])
+                self.primary_keys.add(key)
+                self.rendered_keys.add(key)
+                yield resource
+            self.add_included(serialized_data, self.serializer, include_tree)
+            self.save_fragments()
+
+    def get_streamed_included(self):
+        """Return `included` once streamed, without the primary resources."""
+        if "included" not in self.hash:
+            return None
+        # Resources may have been sideloaded before being streamed as primary
+        return [resource for resource in self.hash["included"]
+                if (resource["type"], resource["id"]) not in self.primary_keys]
+
+    def add_resource(self, serialized_data, serializer):
+        """Build the resource object of `serialized_data` and register it."""
+        resource = self.build_resource(serialized_data, serializer)
+        self.resources[(resource["type"], resource["id"])] = \
+            (resource, serialized_data)
+        return resource
+
+    def build_resource(self, serialized_data, serializer):
+        """
+        Return the resource object of `serialized_data`, going through the
+        fragment cache for cached models.
+        """
+        resource = getattr(serialized_data, "_resource", None)
+        if resource is not None:
+            return resource
+        # Child serializer of a polymorphic serializer
+        serializer = getattr(serialized_data, "_serializer", serializer)
+        resource = self.resource_object_for(serialized_data, serializer)
+        self.add_resource_relationships(resource, serialized_data, serializer)
+        instance = getattr(serialized_data, "_fragment_instance", None)
+        if instance is not None:
+            self.fragments.append((
+                instance, serializer, resource,
+                getattr(serialized_data, "_fragment_entries", None)))
+        return resource
+
+    def save_fragments(self):
+        """Cache the resource objects built since the last call at once."""
+        if self.fragments:
+            get_fragment_cache().set_many(self.fragments)
+            self.fragments = []
+
+    def resolve_linkage_types(self, serialized_data, serializer):
+        """
+        Set the concrete type of the objects related to a batch of serialized
+        objects through polymorphic included serializers (plain multi-table
+        inheritance), which carry the type of the base model until then.
+        Types are queried once per base model and mapped model.
+        """
+        polymorphic_fields = {}
+        pending = OrderedDict()
+        for obj in serialized_data:
+            if getattr(obj, "_resource", None) is not None:
+                # Read from the fragment cache, types included
+                continue
+            obj_serializer = getattr(obj, "_serializer", serializer)
+            if obj_serializer not in polymorphic_fields:
+                polymorphic_fields[obj_serializer] = \
+                    self.get_polymorphic_fields(obj_serializer)
+            for field_name, included in polymorphic_fields[obj_serializer]:
+                model = included.Meta.model
+                related = obj.get(field_name)
+                for item in related if isinstance(related, list) \
+                        else [related]:
+                    if isinstance(item, OrderedDict) and \
+                            hasattr(item, "_is_related") and \
+                            item.get("_drf_jsonapi_type") == \
+                            get_resource_type(model):
+                        pending.setdefault(model, (included, []))[1].append(
+                            item)
+        for model, (included, items) in six.iteritems(pending):
+            missing = set(force_text(item.get("id")) for item in items
+                          if (model, force_text(item.get("id")))
+                          not in self.linkage_types)
+            if missing:
+                for pk, resource_type in six.iteritems(
+                        included.get_linkage_types(sorted(missing))):
+                    self.linkage_types[(model, pk)] = resource_type
+            for item in items:
+                item["_drf_jsonapi_type"] = self.linkage_types[
+                    (model, force_text(item.get("id")))]
+
+    def get_polymorphic_fields(self, serializer):
+        """
+        Return the `(field name, included serializer)` of the relationships
+        of `serializer` whose type is resolved by `resolve_linkage_types`.
+        """
+        fields = []
+        for field_name, key, many in get_field_plan(serializer).relationships:
+            included = get_included_serializer(serializer, field_name)
+            # django-polymorphic loads the related objects downcasted already
+            if hasattr(included, "get_linkage_types") and \
+                    not is_polymorphic(included.Meta.model):
+                fields.append((field_name, included))
+        return fields
+
+    def add_relationships(self, resource, key, data):
+        resource["relationships"][key] = self.dict_class([
+            ("data", [self.dict_class([
+                ("id", force_text(item.get("id"))),
+                ("type", item.get("_drf_jsonapi_type")),
+            ]) for item in data or []])
+        ])
+
+    def add_relationship(self, resource, key, data):
         if data:
-            resource["relationships"][dasherize(rel_name)]["data"] = \
-                OrderedDict([
-                    ("id", force_text(data.get("id"))),
-                    ("type", data.get("_drf_jsonapi_type")),
-                ])
-
-    def add_included(self, rel_name, relationship, parent=None):
-        included_serializer = self.get_included_serializer(
-            relationship.get("parent_serializer"), rel_name)
-        if not included_serializer:
-            return
-        serialized_data = relationship.get("data")
+            data = self.dict_class([
+                ("id", force_text(data.get("id"))),
+                ("type", data.get("_drf_jsonapi_type")),
+            ])
+        else:
+            data = None
+        resource["relationships"][key] = self.dict_class([("data", data)])
+
+    def add_included(self, serialized_data, serializer, include_tree):
+        """Sideload the relationships of a batch of serialized objects.
+
+        `include_tree` is the node of the parsed `include` parameter matching
+        the batch.
+
+        Related primary keys are collected from the whole batch first so that
+        each included serializer costs a single query per nesting level.
+        Related objects already loaded while serializing the batch are
+        reused as is, and resources already in the document are never
+        serialized twice.
+        """
         if not isinstance(serialized_data, list):
             serialized_data = [serialized_data]
-        included_data = []
-        for item in serialized_data:
-            if isinstance(item, OrderedDict) and hasattr(item, '_is_related'):
-                data = self.get_included_data(
-                    rel_name, item.get("id"), included_serializer)
-                if data:
-                    included_data.append(data)
-
-        resource_path = ".".join([parent, rel_name] if parent else [rel_name])
-        if self.include_assoc(resource_path):
-            if "included" not in self.hash:
-                self.hash["included"] = []
-            for data in included_data:
-                attrs = self.attributes_for_serialized_data(
-                    data, included_serializer)
-                self.add_resource_relationships(
-                    attrs, data, included_serializer, add_included=False)
-                if attrs not in self.hash.get("included"):
-                    self.hash["included"].append(attrs)
-        if self.include_nested_assoc(resource_path):
-            for data in included_data:
-                relationships = self.get_relationships_data(
-                    data, included_serializer)
-                for rel_name, relationship in six.iteritems(relationships):
-                    self.add_included(rel_name, relationship, resource_path)
+        # Objects serialized by the children of a polymorphic serializer have
+        # their own relationships
+        batches = OrderedDict()
+        for obj in serialized_data:
+            batches.setdefault(
+                getattr(obj, "_serializer", serializer), []).append(obj)
+        for batch_serializer, batch in six.iteritems(batches):
+            self.add_batch_included(batch, batch_serializer, include_tree)
 
-    def get_included_serializer(self, serializer, rel_name):
-        serializer = getattr(serializer.Meta, "include", {}).get(rel_name)
-        if isinstance(serializer, six.string_types):
-            serializer = import_serializer(serializer)
-        return serializer
-
-    def get_included_data(self, rel_name, pk, included_serializer):
-        model = included_serializer.Meta.model
-        obj = model.objects.get(pk=pk)
-        return included_serializer.to_representation(obj)
-
-    def attributes_for_serialized_data(self, serialized_data, serializer):
-        if isinstance(serialized_data, list):
-            result = []
+    def add_batch_included(self, serialized_data, serializer, include_tree):
+        for field_name, key, many in get_field_plan(serializer).relationships:
+            included_serializer = self.get_included_serializer(
+                serializer, field_name)
+            if not included_serializer:
+                continue
+            node = include_tree.get(key)
+            if node is None:
+                continue
+            related_items = OrderedDict()
             for obj in serialized_data:
-                result.append(self.resource_object_for(obj, serializer))
+                related = obj.get(field_name)
+                if not isinstance(related, list):
+                    related = [related]
+                for item in related:
+                    if isinstance(item, OrderedDict) and \
+                            hasattr(item, "_is_related"):
+                        key = (item.get("_drf_jsonapi_type"),
+                               force_text(item.get("id")))
+                        related_items[key] = item
+            self.check_included_count(related_items)
+            included = self.get_included_resources(
+                related_items, included_serializer)
+
+            if node.included:
+                if "included" not in self.hash:
+                    self.hash["included"] = []
+                for resource, data in included:
+                    self.append_included(resource)
+            if node:
+                self.add_included([data for resource, data in included],
+                                  included_serializer, node)
+
+    def append_included(self, resource):
+        """Append `resource` to `included` unless it is already rendered."""
+        key = (resource["type"], resource["id"])
+        if key not in self.rendered_keys:
+            self.rendered_keys.add(key)
+            self.hash["included"].append(resource)
+
+    def check_included_count(self, related_items):
+        """
+        Enforce `max_included` before fetching a batch of included resources,
+        intermediate resources of a path included. Resources already in the
+        document (e.g. primary data) don't count.
+        """
+        if self.max_included is None:
+            return
+        self.included_count += len(
+            [key for key in related_items if key not in self.resources])
+        if self.included_count > self.max_included:
+            raise InvalidQueryParameter("include", _(
+                "Too many included resources, the maximum is {count}."
+            ).format(count=self.max_included))
+
+    def get_included_resources(self, related_items, included_serializer):
+        """
+        Return the `(resource, serialized data)` pairs of `related_items`,
+        only serializing the ones missing from the identity map.
+        """
+        missing = [item for key, item in six.iteritems(related_items)
+                   if key not in self.resources]
+        loaded = dict((item.get("id"), item._instance) for item in missing
+                      if getattr(item, "_instance", None) is not None)
+        instances = self.get_included_instances(
+            [item.get("id") for item in missing], included_serializer, loaded,
+            [item.get("_drf_jsonapi_type") for item in missing])
+        fragments = hasattr(included_serializer, "get_fragments")
+        if fragments:
+            included_serializer.get_fragments(instances)
+        try:
+            serialized_data = [included_serializer.to_representation(obj)
+                               for obj in instances]
+            self.resolve_linkage_types(serialized_data, included_serializer)
+            for data in serialized_data:
+                self.add_resource(data, included_serializer)
+        finally:
+            if fragments:
+                included_serializer.get_fragments([])
+        return [self.resources[key] for key in related_items
+                if key in self.resources]
+
+    def get_included_serializer(self, serializer, rel_name):
+        included = get_included_serializer(serializer, rel_name)
+        if included is None or self.renderer.request is None:
+            return included
+        return self.get_sparse_serializer(included)
+
+    def get_sparse_serializer(self, serializer):
+        """
+        Return a copy of the (shared) included `serializer` bound to the
+        request when a sparse fieldset applies to its type, so that the
+        fields left out aren't serialized.
+        """
+        fieldsets = get_sparse_fieldsets(self.renderer.request)
+        if not fieldsets or getattr(serializer, "sparse_fieldset", None) \
+                is not None or not hasattr(serializer, "Meta"):
+            return serializer
+        if hasattr(serializer, "get_resource_types"):
+            # Polymorphic serializers pass their context to their children
+            types = serializer.get_resource_types()
         else:
-            result = self.resource_object_for(serialized_data, serializer)
-        return result
+            types = [get_resource_type(serializer.Meta.model)]
+        if not set(types) & set(fieldsets):
+            return serializer
+        if not hasattr(self, "sparse_serializers"):
+            self.sparse_serializers = {}
+        if serializer not in self.sparse_serializers:
+            kwargs = dict(serializer._kwargs,
+                          context={"request": self.renderer.request})
+            self.sparse_serializers[serializer] = serializer.__class__(
+                *serializer._args, **kwargs)
+        return self.sparse_serializers[serializer]
+
+    def get_included_instances(self, pks, included_serializer, loaded=None,
+                               types=None):
+        """
+        Return the instances of `pks`, fetching the ones missing from
+        `loaded` with one query per model (the concrete models given by
+        `types` for polymorphic serializers). Instances of the base model of
+        a polymorphic serializer are downcasted.
+        """
+        # Ids read from cached fragments are strings
+        pks = [force_text(pk) for pk in pks]
+        objs = dict((force_text(pk), obj)
+                    for pk, obj in six.iteritems(loaded or {}))
+        get_child_model = getattr(included_serializer, "get_child_model", None)
+        batches = OrderedDict()
+        for pk, resource_type in zip(pks, types or [None] * len(pks)):
+            if pk in objs:
+                continue
+            model = included_serializer.Meta.model
+            if get_child_model is not None:
+                model = get_child_model(resource_type)
+            batches.setdefault(model, []).append(pk)
+        for model, missing in six.iteritems(batches):
+            queryset = model._default_manager.all()
+            if model is included_serializer.Meta.model and \
+                    hasattr(included_serializer, "get_deferred_fields"):
+                deferred = included_serializer.get_deferred_fields()
+                if deferred:
+                    queryset = queryset.defer(*deferred)
+            objs.update((force_text(pk), obj) for pk, obj in
+                        six.iteritems(queryset.in_bulk(missing)))
+        instances = [objs[pk] for pk in pks if pk in objs]
+        if hasattr(included_serializer, "downcast"):
+            instances = included_serializer.downcast(instances)
+        return instances
 
     def resource_object_for(self, obj, serializer):
         attributes = self.get_attributes_data(obj, serializer)
-        result = OrderedDict([
-            ("id", force_text(attributes.pop("id"))),
+        result = self.dict_class([
+            ("id", force_text(obj["id"])),
             ("type", obj.get('_drf_jsonapi_type')),
         ])
         if attributes:
             result["attributes"] = attributes
         return result
 
-    def add_resource_relationships(self, attrs, serialized_data, serializer,
-                                   add_included=True):
-        relationships = self.get_relationships_data(serialized_data,
-                                                    serializer)
+    def add_resource_relationships(self, attrs, serialized_data, serializer):
+        relationships = get_field_plan(serializer).relationships
         if relationships and "relationships" not in attrs:
-            attrs["relationships"] = OrderedDict()
-        for rel_name, relationship in six.iteritems(relationships):
-            if isinstance(relationship.get("data"), list):
-                self.add_relationships(attrs, rel_name, relationship)
+            attrs["relationships"] = self.dict_class()
+        for field_name, key, many in relationships:
+            if many:
+                self.add_relationships(
+                    attrs, key, serialized_data.get(field_name))
             else:
-                self.add_relationship(attrs, rel_name, relationship)
-            if add_included:
-                self.add_included(rel_name, relationship)
-
-    def include_assoc(self, assoc):
-        return self.check_assoc("{}$".format(assoc))
-
-    def include_nested_assoc(self, assoc):
-        return self.check_assoc("{}.".format(assoc))
-
-    def check_assoc(self, assoc):
-        include_opt = self.renderer.request.query_params.get("include")
-        if not include_opt:
-            return False
-        include_opt = include_opt.split(",")
-        for opt in include_opt:
-            if re.match(r"^{}".format(
-                    dasherize(assoc.replace(".", "\."))), opt):
-                return True
-        return False
+                self.add_relationship(
+                    attrs, key, serialized_data.get(field_name))
 
     def get_attributes_data(self, obj, serializer):
-        attributes = OrderedDict([])
-        for field_name, field in six.iteritems(serializer.get_fields()):
-            if isinstance(field, (RelatedField, ManyRelatedField)):
-                continue
-            attributes[dasherize(field_name)] = obj.get(field_name)
-        return attributes
-
-    def get_relationships_data(self, serialized_data, serializer):
-        relationships = OrderedDict()
-        for field_name, field in serializer.get_fields().items():
-            if isinstance(field, (RelatedField, ManyRelatedField)):
-                relationships[field_name] = {
-                    "field": field,
-                    "parent_serializer": serializer,
-                    "data": serialized_data.get(field_name)
-                }
-        return relationships
+        return self.dict_class([
+            (key, obj.get(field_name))
+            for field_name, key in get_field_plan(serializer).attributes])
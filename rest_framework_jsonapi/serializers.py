@@ -1,31 +1,584 @@
 from collections import OrderedDict
-from rest_framework import serializers
-from rest_framework.relations import PrimaryKeyRelatedField
+from django.core.signals import setting_changed
+from django.db import models
+from django.dispatch import receiver
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.functional import cached_property
+from rest_framework import fields, serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import (
+    PrimaryKeyRelatedField, ManyRelatedField, PKOnlyObject,
+    MANY_RELATION_KWARGS)
 
-from .utils import get_resource_type
+from .cache import get_fragment_cache
+from .utils import (
+    get_resource_type, get_model, format_key, get_sparse_fieldsets,
+    import_serializer_class,
+    get_deferred_fields, get_model_field, get_remote_field, is_to_many,
+    is_polymorphic, get_prefetch_cache_name, targets_primary_key,
+    SPARSE_CACHE_SIZE)
+
+
+def related_representation(pk, resource_type):
+    """Same representation as `JsonApiPrimaryKeyRelatedField`'s."""
+    ret = OrderedDict([
+        ('id', pk),
+        ('_drf_jsonapi_type', resource_type),
+    ])
+    ret._is_related = True
+    return ret
+
+
+def is_related_cached(instance, model_field):
+    """Whether the related object of a to-one relation is already loaded."""
+    if hasattr(model_field, "is_cached"):
+        return model_field.is_cached(instance)
+    return hasattr(instance, model_field.get_cache_name())
 
 
 class JsonApiPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    @cached_property
+    def model_field(self):
+        """
+        The foreign key behind the field, when its linkage can be read from
+        its column: a forward to-one relation to the primary key (no
+        `to_field`) whose target type is known statically (i.e. not
+        polymorphic). `None` otherwise.
+        """
+        model = getattr(getattr(self.parent, "Meta", None), "model", None)
+        if model is None or len(self.source_attrs) != 1:
+            return None
+        model_field = get_model_field(model, self.source_attrs[0])
+        if model_field is None or not model_field.concrete or \
+                not (model_field.many_to_one or model_field.one_to_one) or \
+                not targets_primary_key(model_field) or \
+                is_polymorphic(model_field.related_model):
+            return None
+        return model_field
+
     def use_pk_only_optimization(self):
-        return False
+        return self.model_field is not None
+
+    def get_attribute(self, instance):
+        model_field = self.model_field
+        if model_field is not None and \
+                is_related_cached(instance, model_field):
+            # Already loaded (e.g. with `select_related`), keep it so that
+            # it can be sideloaded as is
+            return getattr(instance, model_field.name)
+        attribute = super(JsonApiPrimaryKeyRelatedField, self).get_attribute(
+            instance)
+        if isinstance(attribute, PKOnlyObject) and attribute.pk is None:
+            # Not handled by the serializer before DRF 3.4
+            return None
+        return attribute
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs.keys():
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return JsonApiManyRelatedField(**list_kwargs)
 
     def to_representation(self, obj):
-        ret = OrderedDict([
-            ('id', obj.pk),
-            ('_drf_jsonapi_type', get_resource_type(obj._meta.model)),
-        ])
-        ret._is_related = True
+        if isinstance(obj, PKOnlyObject):
+            # Read from the foreign key column (or from the page linkage)
+            model_field = self.model_field or self.parent.model_field
+            return related_representation(
+                obj.pk, get_resource_type(model_field.related_model))
+        ret = related_representation(
+            obj.pk, get_resource_type(get_model(obj)))
+        # Keep the loaded instance so that it can be sideloaded as is
+        ret._instance = obj
         return ret
 
 
+class JsonApiManyRelatedField(ManyRelatedField):
+    # Set by `JsonApiListSerializer` while it serializes a page of instances:
+    # {instance pk: [related pks]}
+    page_linkage = None
+
+    @cached_property
+    def model_field(self):
+        """
+        The to-many relation (many-to-many or reverse foreign key to the
+        primary key) behind the field, when its type is known statically
+        (i.e. not polymorphic). `None` otherwise.
+        """
+        model = getattr(getattr(self.parent, "Meta", None), "model", None)
+        if model is None or len(self.source_attrs) != 1 or \
+                type(self.child_relation) is not \
+                JsonApiPrimaryKeyRelatedField:
+            return None
+        model_field = get_model_field(model, self.source_attrs[0])
+        if model_field is None or not model_field.is_relation or \
+                not is_to_many(model_field) or \
+                not targets_primary_key(model_field) or \
+                is_polymorphic(model_field.related_model):
+            return None
+        return model_field
+
+    def is_prefetched(self, instance):
+        """Whether the related objects of `instance` are prefetched."""
+        return get_prefetch_cache_name(self.model_field) in getattr(
+            instance, "_prefetched_objects_cache", {})
+
+    def get_attribute(self, instance):
+        if self.page_linkage is not None:
+            return [PKOnlyObject(pk=pk)
+                    for pk in self.page_linkage.get(instance.pk, [])]
+        return super(JsonApiManyRelatedField, self).get_attribute(instance)
+
+    def get_linkage_queryset(self, pks):
+        """
+        Return the `(instance pk, related pk)` pairs of the relation for
+        `pks`, in the order of the related manager.
+        """
+        model_field = self.model_field
+        related_model = model_field.related_model
+        if model_field.one_to_many:
+            # Reverse foreign key, read from the related table
+            return related_model._default_manager.filter(**{
+                model_field.field.name + "__in": pks,
+            }).values_list(model_field.field.attname, "pk")
+        if model_field.concrete:
+            field, through = model_field, get_remote_field(model_field).through
+            source, target = field.m2m_field_name(), \
+                field.m2m_reverse_field_name()
+            query_name = field.related_query_name()
+        else:
+            field, through = model_field.field, model_field.through
+            source, target = field.m2m_reverse_field_name(), \
+                field.m2m_field_name()
+            query_name = field.name
+        if related_model._meta.ordering or \
+                type(related_model._default_manager) is not models.Manager:
+            # Only the related manager knows the order and the filtering
+            return related_model._default_manager.filter(**{
+                query_name + "__in": pks}).values_list(query_name, "pk")
+        return through._default_manager.filter(**{
+            source + "__in": pks,
+        }).order_by("pk").values_list(
+            through._meta.get_field(source).attname,
+            through._meta.get_field(target).attname)
+
+
+class JsonApiListSerializer(serializers.ListSerializer):
+    """
+    List serializer of `JsonApiSerializer`.
+
+    The linkage of the to-many relations (many-to-many and reverse foreign
+    keys) is read for the whole list with one `values_list()` query per
+    relation, on the through table for many-to-many relations. Relations
+    prefetched on the instances are read as is.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        instances = list(iterable)
+        fields = self.get_page_linkage_fields(instances)
+        fragments = hasattr(self.child, "get_fragments")
+        if fragments:
+            self.child.get_fragments(instances)
+        try:
+            # Instances read from the fragment cache have their linkage
+            pks = [instance.pk for instance in instances
+                   if not fragments or not self.child.has_fragment(instance)
+                   ] if fields else []
+            for field in fields:
+                linkage = {}
+                if pks:
+                    for pk, related_pk in field.get_linkage_queryset(pks):
+                        linkage.setdefault(pk, []).append(related_pk)
+                field.page_linkage = linkage
+            return super(JsonApiListSerializer, self).to_representation(
+                instances)
+        finally:
+            for field in fields:
+                field.page_linkage = None
+            if fragments:
+                self.child.get_fragments([])
+
+    def get_page_linkage_fields(self, instances):
+        if not instances or isinstance(instances[0], dict) or \
+                not hasattr(self.child, "fields"):
+            return []
+        return [
+            field for field in self.child.fields.values()
+            if isinstance(field, JsonApiManyRelatedField) and
+            not field.write_only and field.model_field is not None and
+            not field.is_prefetched(instances[0])]
+
+
+# Fields that can be read from `values()` rows, the ones whose
+# representation doesn't depend on anything but the column value
+VALUES_FIELDS = (
+    fields.CharField, fields.IntegerField, fields.FloatField,
+    fields.DecimalField, fields.BooleanField, fields.NullBooleanField,
+    fields.DateTimeField, fields.DateField, fields.TimeField,
+    fields.DurationField, fields.UUIDField, fields.ChoiceField,
+    fields.ReadOnlyField)
+# Fields whose representation is the column value itself
+RAW_VALUES_FIELDS = (
+    fields.CharField, fields.EmailField, fields.SlugField, fields.URLField,
+    fields.ReadOnlyField)
+
+
+class ValuesPlan(object):
+    """
+    Plan to serialize `values()` rows of a model: the columns to fetch and,
+    per field, the column and the conversion of its (non null) value.
+    """
+
+    def __init__(self, model, fields):
+        self.resource_type = get_resource_type(model)
+        self.columns = []
+        # [(field name, column, conversion or None)]
+        self.fields = []
+        for field_name, field in fields.items():
+            if field.write_only:
+                continue
+            column, convert = self.get_column(
+                model, field.source or field_name, field)
+            self.columns.append(column)
+            self.fields.append((field_name, column, convert))
+
+    @classmethod
+    def get_column(cls, model, source, field):
+        """
+        Return the `(column, conversion)` of a field, raise `ValueError` if
+        the field can't be read from a column.
+        """
+        model_field = get_model_field(model, source)
+        if model_field is None or not model_field.concrete:
+            raise ValueError(source)
+        if type(field) is JsonApiPrimaryKeyRelatedField and \
+                model_field.is_relation and \
+                (model_field.many_to_one or model_field.one_to_one) and \
+                targets_primary_key(model_field) and \
+                not is_polymorphic(model_field.related_model):
+            resource_type = get_resource_type(model_field.related_model)
+            return model_field.attname, \
+                lambda pk: related_representation(pk, resource_type)
+        if model_field.is_relation or not isinstance(field, VALUES_FIELDS) \
+                or isinstance(field, fields.MultipleChoiceField):
+            raise ValueError(source)
+        if type(field) in RAW_VALUES_FIELDS:
+            return model_field.attname, None
+        return model_field.attname, field.to_representation
+
+    def to_representation(self, row):
+        ret = OrderedDict()
+        for field_name, column, convert in self.fields:
+            value = row[column]
+            if convert is not None and value is not None:
+                value = convert(value)
+            ret[field_name] = value
+        ret['_drf_jsonapi_type'] = self.resource_type
+        return ret
+
+
+# Values plans per serializer class and sparse fieldset
+_values_plans = {}
+
+
+@receiver(setting_changed)
+def clear_values_plans(setting, **kwargs):
+    if setting == "REST_FRAMEWORK":
+        _values_plans.clear()
+
+
+def get_values_plan(serializer):
+    """
+    Return the values plan of the serializer (per class and sparse fieldset),
+    `None` when it doesn't opt in with `Meta.read_from_values` or when one of
+    its fields isn't a plain column or foreign key.
+    """
+    key = (serializer.__class__, serializer.sparse_fieldset)
+    try:
+        return _values_plans[key]
+    except KeyError:
+        plan = None
+        model = serializer.Meta.model
+        if getattr(serializer.Meta, "read_from_values", False) and \
+                not is_polymorphic(model):
+            try:
+                plan = ValuesPlan(model, serializer.fields)
+            except ValueError:
+                pass
+        if len(_values_plans) >= SPARSE_CACHE_SIZE:
+            _values_plans.clear()
+        _values_plans[key] = plan
+        return plan
+
+
 class JsonApiSerializerMixin(object):
     serializer_related_field = JsonApiPrimaryKeyRelatedField
+    # Unless `Meta.list_serializer_class` is set
+    default_list_serializer_class = JsonApiListSerializer
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # Same as DRF's, with a different default list serializer
+        allow_empty = kwargs.pop("allow_empty", None)
+        list_kwargs = {"child": cls(*args, **kwargs)}
+        if allow_empty is not None:
+            list_kwargs["allow_empty"] = allow_empty
+        list_kwargs.update(dict(
+            (key, value) for key, value in kwargs.items()
+            if key in serializers.LIST_SERIALIZER_KWARGS))
+        list_serializer_class = getattr(
+            getattr(cls, "Meta", None), "list_serializer_class",
+            cls.default_list_serializer_class)
+        return list_serializer_class(*args, **list_kwargs)
+
+    @cached_property
+    def sparse_fieldset(self):
+        """
+        The formatted names of the fields requested with the `fields[TYPE]`
+        query parameter for the serializer's type, `None` if not restricted.
+        Only applies to reads.
+        """
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        return get_sparse_fieldsets(request).get(
+            get_resource_type(self.Meta.model))
+
+    def get_fields(self):
+        fields = super(JsonApiSerializerMixin, self).get_fields()
+        fieldset = self.sparse_fieldset
+        if fieldset is None:
+            return fields
+        # Fields left out aren't serialized at all
+        return OrderedDict([
+            (field_name, field) for field_name, field in fields.items()
+            if field_name == "id" or format_key(field_name) in fieldset])
+
+    def get_deferred_fields(self):
+        """Return the model fields that can be deferred when loading data."""
+        if self.sparse_fieldset is None:
+            return []
+        return get_deferred_fields(self.__class__, self.sparse_fieldset)
+
+    def get_values_plan(self):
+        return get_values_plan(self)
+
+    # Cache entries of the instances being serialized, see `get_fragments`
+    fragment_entries = None
+
+    def get_fragment_cache(self):
+        """
+        The fragment cache, `None` when it isn't configured or the serializer
+        opts out of it (`Meta.cache_fragments = False`).
+        """
+        if not getattr(getattr(self, "Meta", None), "cache_fragments", True):
+            return None
+        return get_fragment_cache()
+
+    def get_fragment_variant(self):
+        """
+        Return what the output depends on besides the instance, serializer
+        and sparse fieldset (e.g. the user for fields depending on
+        `request.user`), fragments being cached apart for each value.
+        """
+        return None
+
+    def has_fragment(self, instance):
+        """Whether `instance` is read from the fragments of `get_fragments`."""
+        cache = self.get_fragment_cache()
+        if self.fragment_entries is None or isinstance(instance, dict) or \
+                cache is None or not cache.is_cached(get_model(instance)):
+            return False
+        return cache.get(instance, self, self.fragment_entries) is not None
+
+    def add_loaded_related(self, ret, instance):
+        """
+        Keep the related objects already loaded on `instance` (e.g. with
+        `select_related`) along with the linkage read from a fragment, so
+        that they can be sideloaded without another query.
+        """
+        for field in self.fields.values():
+            model_field = getattr(field, "model_field", None)
+            related = ret.get(field.field_name)
+            if isinstance(field, JsonApiPrimaryKeyRelatedField) and \
+                    model_field is not None and related is not None and \
+                    is_related_cached(instance, model_field):
+                related._instance = getattr(instance, model_field.name)
+
+    def get_fragments(self, instances):
+        """
+        Read the fragments of `instances` with a single cache lookup, before
+        serializing them (forgotten with an empty list).
+        """
+        cache = self.get_fragment_cache()
+        if cache is None:
+            return
+        instances = [instance for instance in instances
+                     if not isinstance(instance, dict) and
+                     cache.is_cached(get_model(instance))]
+        self.fragment_entries = cache.get_many(instances) if instances \
+            else None
 
     def to_representation(self, instance):
+        if isinstance(instance, dict):
+            # A `values()` row, see `ValuesListMixin`
+            return self.get_values_plan().to_representation(instance)
+        cache = self.get_fragment_cache()
+        if cache is not None and cache.is_cached(get_model(instance)):
+            resource = cache.get(instance, self, self.fragment_entries)
+            if resource is not None:
+                ret = cache.to_representation(resource, self)
+                self.add_loaded_related(ret, instance)
+                return ret
         ret = super(JsonApiSerializerMixin, self).to_representation(instance)
-        ret['_drf_jsonapi_type'] = get_resource_type(instance._meta.model)
+        ret['_drf_jsonapi_type'] = get_resource_type(get_model(instance))
+        if cache is not None and cache.is_cached(get_model(instance)):
+            # The adapter caches the resource object once rendered, along
+            # with the entries already read
+            ret._fragment_instance = instance
+            ret._fragment_entries = self.fragment_entries
         return ret
 
 
 class JsonApiSerializer(JsonApiSerializerMixin, serializers.ModelSerializer):
     pass
+
+
+class PolymorphicListSerializer(JsonApiListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        return super(PolymorphicListSerializer, self).to_representation(
+            self.child.downcast(list(iterable)))
+
+
+class PolymorphicJsonApiSerializer(JsonApiSerializer):
+    """
+    Serialize the instances of a model hierarchy with the serializers of
+    their concrete model, given by `Meta.polymorphic_serializers`:
+
+        class Meta:
+            model = BaseOrganization
+            polymorphic_serializers = {
+                Company: CompanySerializer,
+                Association: "organizations.serializers.AssociationSerializer",
+            }
+
+    Instances of models that aren't mapped (nor any of their parents) use
+    the serializer itself. Child serializers are instantiated once per
+    serializer (i.e. once per request for the view's serializer), with its
+    context.
+
+    Without django-polymorphic, lists of instances of the base model are
+    downcasted with one query per mapped model.
+    """
+
+    default_list_serializer_class = PolymorphicListSerializer
+
+    @cached_property
+    def polymorphic_serializers(self):
+        """The child serializer classes, keyed by model."""
+        ret = OrderedDict()
+        for model, serializer_class in getattr(
+                self.Meta, "polymorphic_serializers", {}).items():
+            if isinstance(serializer_class, six.string_types):
+                serializer_class = import_serializer_class(serializer_class)
+            ret[model] = serializer_class
+        return ret
+
+    @cached_property
+    def child_serializers(self):
+        return {}
+
+    def get_child_serializer(self, model):
+        """Return the child serializer of `model`, `None` if not mapped."""
+        if model not in self.child_serializers:
+            child = None
+            for parent in model.__mro__:
+                if parent in self.polymorphic_serializers:
+                    child = self.polymorphic_serializers[parent](
+                        context=self.context)
+                    break
+            self.child_serializers[model] = child
+        return self.child_serializers[model]
+
+    def get_child_model(self, resource_type):
+        """Return the model of a resource type of the hierarchy."""
+        for model in self.polymorphic_serializers:
+            if get_resource_type(model) == resource_type:
+                return model
+        return self.Meta.model
+
+    def get_resource_types(self):
+        return [get_resource_type(model) for model in
+                [self.Meta.model] + list(self.polymorphic_serializers)]
+
+    def get_values_plan(self):
+        return None
+
+    def has_fragment(self, instance):
+        child = None
+        if not isinstance(instance, dict):
+            child = self.get_child_serializer(get_model(instance))
+        if child is None:
+            return super(PolymorphicJsonApiSerializer, self).has_fragment(
+                instance)
+        return child.has_fragment(instance)
+
+    def get_fragments(self, instances):
+        super(PolymorphicJsonApiSerializer, self).get_fragments(instances)
+        for instance in instances:
+            if not isinstance(instance, dict):
+                self.get_child_serializer(get_model(instance))
+        for child in self.child_serializers.values():
+            if child is not None:
+                child.fragment_entries = self.fragment_entries
+
+    def downcast(self, instances):
+        """
+        Replace the instances of the base model by their concrete model
+        instance, with one query per mapped model. Instances loaded by
+        django-polymorphic are already downcasted.
+        """
+        model = self.Meta.model
+        pks = [instance.pk for instance in instances
+               if get_model(instance) is model]
+        if not pks or is_polymorphic(model):
+            return instances
+        concrete = {}
+        for child_model in self.polymorphic_serializers:
+            if child_model is not model and issubclass(child_model, model):
+                concrete.update(child_model._default_manager.in_bulk(pks))
+        return [concrete.get(instance.pk, instance)
+                if get_model(instance) is model else instance
+                for instance in instances]
+
+    def get_linkage_types(self, pks):
+        """
+        Return the resource types of the instances of `pks`, keyed by
+        `force_text(pk)`, with one query per mapped model.
+        """
+        model = self.Meta.model
+        types = dict((force_text(pk), get_resource_type(model))
+                     for pk in pks)
+        for child_model in self.polymorphic_serializers:
+            if child_model is not model and issubclass(child_model, model):
+                resource_type = get_resource_type(child_model)
+                for pk in child_model._default_manager.filter(
+                        pk__in=pks).values_list("pk", flat=True):
+                    types[force_text(pk)] = resource_type
+        return types
+
+    def to_representation(self, instance):
+        child = None
+        if not isinstance(instance, dict):
+            child = self.get_child_serializer(get_model(instance))
+        if child is None:
+            return super(PolymorphicJsonApiSerializer, self).to_representation(
+                instance)
+        ret = child.to_representation(instance)
+        # The adapter renders the resource object with the child's fields
+        ret._serializer = child
+        return ret
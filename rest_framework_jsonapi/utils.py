@@ -1,10 +1,28 @@
 from __future__ import unicode_literals
 
+from collections import OrderedDict
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import six
 from django.utils.encoding import force_text
+from django.utils.translation import ugettext as _
 from rest_framework.compat import importlib
+from rest_framework.relations import RelatedField
 from rest_framework.serializers import ListSerializer, ManyRelatedField
-from inflection import underscore, dasherize
+from inflection import underscore, dasherize, camelize
+
+from .exceptions import InvalidQueryParameter
+
+try:
+    from django.db.models import prefetch_related_objects
+except ImportError:
+    # Django < 1.10
+    from django.db.models import query
+
+    def prefetch_related_objects(instances, *lookups):
+        query.prefetch_related_objects(instances, lookups)
 
 
 def get_serializer(serializer):
@@ -15,29 +33,437 @@ def get_serializer(serializer):
     return serializer
 
 
-def get_resource_type(model):
-    RESOURCE_TYPE_EXTRACTOR = getattr(
-        settings, "REST_FRAMEWORK", None).get("RESOURCE_TYPE_EXTRACTOR", None)
-    if RESOURCE_TYPE_EXTRACTOR:
+KEY_FORMATS = {
+    "dasherize": (dasherize, underscore),
+    "camelize": (lambda key: camelize(key, False), underscore),
+    None: (lambda key: key, lambda key: key),
+}
+
+# Formatting is memoized in both directions: the set of keys is small but
+# they are formatted for every rendered or parsed object.
+KEY_CACHE_SIZE = 4096
+_key_formats = []
+_formatted_keys = {}
+_unformatted_keys = {}
+
+
+def get_key_format():
+    """Return the `(format, unformat)` functions of the KEY_FORMAT setting."""
+    if not _key_formats:
+        key_format = getattr(settings, "REST_FRAMEWORK", {}).get(
+            "KEY_FORMAT", "dasherize")
         try:
-            parts = RESOURCE_TYPE_EXTRACTOR.split(".")
-            module_path, class_name = ".".join(parts[:-1]), parts[-1]
-            module = importlib.import_module(module_path)
-            return getattr(module, class_name)(model)
-        except (ImportError, AttributeError) as e:
-            msg = ("Could not import '{}' for API setting "
-                   "'RESOURCE_TYPE_EXTRACTOR'. {}: {}.".format(
-                       RESOURCE_TYPE_EXTRACTOR, e.__class__.__name__, e))
-            raise ImportError(msg)
+            _key_formats.append(KEY_FORMATS[key_format])
+        except KeyError:
+            raise ValueError(
+                "Invalid value '{}' for API setting 'KEY_FORMAT'. Valid "
+                "values are 'dasherize', 'camelize' and None.".format(
+                    key_format))
+    return _key_formats[0]
+
+
+def _get_cached_key(cache, func, key):
+    try:
+        return cache[key]
+    except KeyError:
+        if len(cache) >= KEY_CACHE_SIZE:
+            cache.clear()
+        value = cache[key] = func(key)
+        return value
+
+
+def format_key(name):
+    """Format a field name as a JSONAPI member name (e.g. `first-name`)."""
+    return _get_cached_key(_formatted_keys, get_key_format()[0], name)
+
+
+def unformat_key(key):
+    """Convert a JSONAPI member name back to a field name."""
+    return _get_cached_key(_unformatted_keys, get_key_format()[1], key)
+
+
+@receiver(setting_changed)
+def clear_settings_caches(setting, **kwargs):
+    if setting == "REST_FRAMEWORK":
+        del _key_formats[:]
+        _formatted_keys.clear()
+        _unformatted_keys.clear()
+        _field_plans.clear()
+        _deferred_fields.clear()
+        del _resource_type_extractors[:]
+        _resource_types.clear()
+
+
+class FieldPlan(object):
+    """
+    Rendering plan of a serializer class: the attributes and relationships
+    names along with their formatted keys, in the serializer fields order.
+    """
+
+    def __init__(self, fields):
+        # [(field name, key)]
+        self.attributes = []
+        # [(field name, key, to many)]
+        self.relationships = []
+        for field_name, field in six.iteritems(fields):
+            if isinstance(field, (RelatedField, ManyRelatedField)):
+                self.relationships.append((
+                    field_name, format_key(field_name),
+                    isinstance(field, ManyRelatedField)))
+            elif field_name != "id":
+                self.attributes.append((field_name, format_key(field_name)))
+
+
+# Plans and deferred fields are also keyed by the requested sparse fieldset
+SPARSE_CACHE_SIZE = 1024
+_field_plans = {}
+_deferred_fields = {}
+
+
+def get_field_plan(serializer):
+    """
+    Return the field plan of the serializer class, built once per sparse
+    fieldset.
+    """
+    key = (serializer.__class__, getattr(serializer, "sparse_fieldset", None))
+    plan = _field_plans.get(key)
+    if plan is None:
+        if len(_field_plans) >= SPARSE_CACHE_SIZE:
+            _field_plans.clear()
+        plan = FieldPlan(serializer.get_fields())
+        _field_plans[key] = plan
+    return plan
+
+
+def parse_fields(query_params):
+    """
+    Parse the `fields[TYPE]` query parameters into a dict of
+    `{type: frozenset of formatted field names}`.
+    """
+    fieldsets = {}
+    for param, value in six.iteritems(query_params):
+        if param.startswith("fields[") and param.endswith("]"):
+            fieldsets[param[7:-1]] = frozenset(
+                key for key in value.split(",") if key)
+    return fieldsets
+
+
+def get_sparse_fieldsets(request):
+    """Return the `fields[TYPE]` query parameters, parsed once per request."""
+    fieldsets = getattr(request, "_sparse_fieldsets", None)
+    if fieldsets is None:
+        fieldsets = parse_fields(request.query_params)
+        request._sparse_fieldsets = fieldsets
+    return fieldsets
+
+
+def get_deferred_fields(serializer_class, fieldset):
+    """
+    Return the names of the model columns that only back the fields left out
+    of `fieldset`, so that they can be deferred. Relations, primary keys and
+    the version field of the fragment cache are never deferred.
+    """
+    # Avoid an import cycle
+    from .cache import get_fragment_cache
+
+    key = (serializer_class, fieldset)
+    deferred = _deferred_fields.get(key)
+    if deferred is None:
+        model = serializer_class.Meta.model
+        fragment_cache = get_fragment_cache()
+        version_field = fragment_cache and \
+            fragment_cache.get_version_field(model)
+        kept, dropped = set(), set()
+        for field_name, field in six.iteritems(
+                serializer_class().get_fields()):
+            source = field.source or field_name
+            if field_name == "id" or format_key(field_name) in fieldset:
+                kept.add(source)
+            else:
+                dropped.add(source)
+        deferred = []
+        for source in sorted(dropped - kept):
+            model_field = get_model_field(model, source)
+            if model_field is not None and model_field.concrete and \
+                    not model_field.is_relation and \
+                    not model_field.primary_key and \
+                    model_field.name != version_field:
+                deferred.append(model_field.name)
+        if len(_deferred_fields) >= SPARSE_CACHE_SIZE:
+            _deferred_fields.clear()
+        _deferred_fields[key] = deferred
+    return deferred
+
+
+def get_default_resource_type(model):
     return force_text(dasherize(underscore(model._meta.object_name)).strip())
 
 
-def import_serializer(path):
+_resource_type_extractors = []
+_resource_types = {}
+
+
+def get_resource_type_extractor():
+    """Return the `RESOURCE_TYPE_EXTRACTOR` callback, imported once."""
+    if not _resource_type_extractors:
+        RESOURCE_TYPE_EXTRACTOR = getattr(settings, "REST_FRAMEWORK", {}).get(
+            "RESOURCE_TYPE_EXTRACTOR", None)
+        extractor = get_default_resource_type
+        if RESOURCE_TYPE_EXTRACTOR:
+            try:
+                parts = RESOURCE_TYPE_EXTRACTOR.split(".")
+                module_path, class_name = ".".join(parts[:-1]), parts[-1]
+                module = importlib.import_module(module_path)
+                extractor = getattr(module, class_name)
+            except (ImportError, AttributeError) as e:
+                msg = ("Could not import '{}' for API setting "
+                       "'RESOURCE_TYPE_EXTRACTOR'. {}: {}.".format(
+                           RESOURCE_TYPE_EXTRACTOR, e.__class__.__name__, e))
+                raise ImportError(msg)
+        _resource_type_extractors.append(extractor)
+    return _resource_type_extractors[0]
+
+
+def get_resource_type(model):
+    """Return the resource type of `model`, extracted once per model."""
+    try:
+        return _resource_types[model]
+    except KeyError:
+        resource_type = get_resource_type_extractor()(model)
+        _resource_types[model] = resource_type
+        return resource_type
+
+
+def import_serializer_class(path):
     try:
         parts = path.split(".")
         module_path, class_name = ".".join(parts[:-1]), parts[-1]
         module = importlib.import_module(module_path)
-        return getattr(module, class_name)()
+        return getattr(module, class_name)
     except (ImportError, AttributeError):
         raise ImportError("Could not import serializer '{}' from {}".format(
             class_name, path))
+
+
+def import_serializer(path):
+    return import_serializer_class(path)()
+
+
+class IncludeTree(OrderedDict):
+    """
+    Trie of formatted include paths, mapping relation names to subtrees.
+    `included` flags the nodes on which a requested path ends.
+    """
+    included = False
+
+    def paths(self, parent=()):
+        for name, node in six.iteritems(self):
+            path = parent + (name,)
+            if node.included:
+                yield path
+            for subpath in node.paths(path):
+                yield subpath
+
+
+def parse_include(include):
+    tree = IncludeTree()
+    for path in (include or "").split(","):
+        if not path:
+            continue
+        node = tree
+        for name in path.split("."):
+            node = node.setdefault(name, IncludeTree())
+        node.included = True
+    return tree
+
+
+def get_include_tree(request):
+    """Return the `include` query parameter, parsed once per request."""
+    tree = getattr(request, "_include_tree", None)
+    if tree is None:
+        tree = parse_include(request.query_params.get("include"))
+        request._include_tree = tree
+    return tree
+
+
+def get_included_serializer(serializer, field_name):
+    included = getattr(serializer.Meta, "include", {}).get(field_name)
+    if isinstance(included, six.string_types):
+        included = import_serializer(included)
+    return included
+
+
+def get_model(instance):
+    """
+    Return the model of `instance`. Instances with deferred fields have their
+    own proxy class on Django < 1.10.
+    """
+    model = instance._meta.model
+    if getattr(model, "_deferred", False):
+        return model._meta.proxy_for_model
+    return model
+
+
+def get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        pass
+    # Reverse relations are looked up by their accessor name (`comment_set`)
+    for model_field in model._meta.get_fields():
+        if model_field.auto_created and not model_field.concrete and \
+                model_field.get_accessor_name() == name:
+            return model_field
+    return None
+
+
+def get_remote_field(model_field):
+    # `rel` before Django 1.9
+    return getattr(model_field, "remote_field", None) or model_field.rel
+
+
+def is_to_many(model_field):
+    return model_field.many_to_many or model_field.one_to_many
+
+
+def targets_primary_key(model_field):
+    """
+    Whether the column of a foreign key (or of the foreign key behind a
+    reverse relation) holds the primary key of the related object, i.e. it
+    has no `to_field`. Always true for many-to-many relations.
+    """
+    if model_field.many_to_many:
+        return True
+    field = model_field if model_field.concrete else model_field.field
+    return field.target_field.primary_key
+
+
+def get_prefetch_cache_name(model_field):
+    """
+    Return the key of the objects of a to-many relation in the
+    `_prefetched_objects_cache` of instances: the name of many-to-many
+    fields, and the related query name of reverse relations (e.g. `comment`
+    for `comment_set`).
+    """
+    if model_field.auto_created and not model_field.concrete:
+        return model_field.field.related_query_name()
+    return model_field.name
+
+
+def is_polymorphic(model):
+    return getattr(model, "polymorphic_model_marker", False)
+
+
+def get_lookup(field):
+    """
+    Return the ORM lookup of a formatted field path (e.g. `author__last_name`
+    for `author.last-name`).
+    """
+    return "__".join(
+        "pk" if name == "id" else unformat_key(name)
+        for name in field.split("."))
+
+
+def parse_sort(sort):
+    """
+    Parse a `sort` query parameter into `(field, lookup)` pairs, `field`
+    being the formatted sort field (e.g. `-author.last-name`) and `lookup`
+    its ORM ordering (e.g. `-author__last_name`).
+    """
+    ret = []
+    for field in sort.split(","):
+        descending = field.startswith("-")
+        path = field[1:] if descending else field
+        if not all(path.split(".")):
+            raise InvalidQueryParameter("sort", _(
+                "Invalid sort field '{field}'.").format(field=field))
+        lookup = get_lookup(path)
+        ret.append((field, "-" + lookup if descending else lookup))
+    return ret
+
+
+def get_lookup_field(model, lookup):
+    """
+    Return the model field `lookup` ends on, following to-one relations.
+    `None` unless it is a concrete column (or foreign key).
+    """
+    names = lookup.lstrip("-").split("__")
+    for index, name in enumerate(names):
+        if name == "pk":
+            model_field = model._meta.pk
+        else:
+            model_field = get_model_field(model, name)
+        if model_field is None or not model_field.concrete or \
+                (model_field.is_relation and is_to_many(model_field)):
+            return None
+        if index < len(names) - 1:
+            if not model_field.is_relation:
+                return None
+            model = model_field.related_model
+    return model_field
+
+
+def get_sort_field(model, lookup):
+    """
+    Return the model field sorted on by `lookup`, following to-one
+    relations. `None` unless it is a concrete column.
+    """
+    model_field = get_lookup_field(model, lookup)
+    if model_field is None or model_field.is_relation:
+        return None
+    return model_field
+
+
+def get_indexed_sorts(model):
+    """
+    Return the lookups of the model's indexes: its primary key, indexed
+    and unique columns, `index_together` and `unique_together`.
+    """
+    opts = model._meta
+    ret = [("pk",)]
+    for model_field in opts.concrete_fields:
+        if not model_field.is_relation and not model_field.primary_key and \
+                (model_field.db_index or model_field.unique):
+            ret.append((model_field.name,))
+    for names in tuple(opts.index_together) + tuple(opts.unique_together):
+        ret.append(tuple(
+            "pk" if opts.get_field(name).primary_key else name
+            for name in names))
+    return ret
+
+
+def is_indexed_sort(model, lookups):
+    lookups = tuple(
+        "pk" if lookup in ("pk", model._meta.pk.name) else lookup
+        for lookup in (lookup.lstrip("-") for lookup in lookups))
+    if len(lookups) > 1 and lookups[-1] == "pk":
+        # The primary key after an index still reads the index
+        lookups = lookups[:-1]
+    return any(index[:len(lookups)] == lookups
+               for index in get_indexed_sorts(model))
+
+
+def get_sort(request, view, model):
+    """
+    Return the ordering of the `sort` query parameter, `None` if it isn't
+    set. Sort fields must be in the `allowed_sorts` of the view, if any, or
+    else match an index of the model (see `get_indexed_sorts`).
+    """
+    sort = request.query_params.get("sort")
+    if not sort:
+        return None
+    fields = parse_sort(sort)
+    allowed_sorts = getattr(view, "allowed_sorts", None)
+    for field, lookup in fields:
+        field = field.lstrip("-")
+        if get_sort_field(model, lookup) is None:
+            raise InvalidQueryParameter("sort", _(
+                "Sorting by '{field}' is not supported.").format(field=field))
+        if allowed_sorts is not None and field not in allowed_sorts:
+            raise InvalidQueryParameter("sort", _(
+                "Sorting by '{field}' is not allowed.").format(field=field))
+    ordering = tuple(lookup for field, lookup in fields)
+    if allowed_sorts is None and not is_indexed_sort(model, ordering):
+        raise InvalidQueryParameter("sort", _(
+            "Sorting by '{sort}' is not allowed.").format(sort=sort))
+    return ordering
@@ -3,7 +3,9 @@ from __future__ import unicode_literals
 from collections import OrderedDict
 from django.utils import six
 from rest_framework.views import exception_handler as drf_exception_handler
-from inflection import dasherize
+
+from .exceptions import InvalidQueryParameter
+from .utils import format_key
 
 
 def exception_handler(exc, context):
@@ -31,7 +33,7 @@ def exception_handler(exc, context):
         for field, error in response.data.items():
             # Field errors
             if isinstance(error, list):
-                field = dasherize(field)
+                field = format_key(field)
                 pointer = "/data/attributes/{}".format(field)
                 for message in error:
                     errors.append({
@@ -43,11 +45,13 @@ def exception_handler(exc, context):
                     })
             # Other errors (e.g. Http404, PermissionDenied, throttling errors)
             elif field == "detail" and isinstance(error, six.string_types):
+                if isinstance(exc, InvalidQueryParameter):
+                    source = {"parameter": exc.parameter}
+                else:
+                    source = {"pointer": "/data"}
                 errors.append({
                     "detail": error,
-                    "source": {
-                        "pointer": "/data",
-                    },
+                    "source": source,
                     "status": six.text_type(response.status_code),
                 })
 
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from polymorphic.models import PolymorphicModel
 
 
@@ -41,3 +42,45 @@ class Individual(models.Model):
     organization = models.ForeignKey('BaseOrganization', null=True, blank=True)
     other_organizations = models.ManyToManyField(
         'BaseOrganization', null=True, blank=True)
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=128)
+    parent = models.ForeignKey('self', null=True, blank=True)
+
+
+class Post(models.Model):
+    title = models.CharField(max_length=128)
+    created = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    published = models.BooleanField(default=False)
+
+    class Meta:
+        index_together = (("created", "title"),)
+
+
+class Vehicle(models.Model):
+    name = models.CharField(max_length=128)
+
+
+class Car(Vehicle):
+    doors = models.PositiveSmallIntegerField(default=4)
+
+
+class Bike(Vehicle):
+    pass
+
+
+class Garage(models.Model):
+    name = models.CharField(max_length=128)
+    vehicle = models.ForeignKey(Vehicle, null=True, blank=True)
+    vehicles = models.ManyToManyField(Vehicle, related_name="garages")
+    annex = models.ForeignKey("self", null=True, blank=True)
+
+
+class Label(models.Model):
+    code = models.CharField(max_length=16, unique=True)
+
+
+class Labelled(models.Model):
+    label = models.ForeignKey(Label, to_field="code")
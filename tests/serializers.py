@@ -1,9 +1,10 @@
 from __future__ import unicode_literals
 
-from rest_framework_jsonapi.serializers import JsonApiSerializer
+from rest_framework_jsonapi.serializers import (
+    JsonApiSerializer, PolymorphicJsonApiSerializer)
 from tests.models import (
     Article, Person, Comment, FormattingWithABBR, Individual, BaseOrganization,
-    Company, Association)
+    Company, Association, Category, Post, Vehicle, Car, Bike, Garage)
 
 
 class PersonSerializer(JsonApiSerializer):
@@ -40,6 +41,15 @@ class InvalidLazyCommentSerializer(JsonApiSerializer):
         }
 
 
+class ValuesCommentSerializer(JsonApiSerializer):
+    class Meta:
+        model = Comment
+        read_from_values = True
+        include = {
+            "author": PersonSerializer(),
+        }
+
+
 class ArticleSerializer(JsonApiSerializer):
     class Meta:
         model = Article
@@ -88,20 +98,14 @@ class AssociationSerializer(JsonApiSerializer):
         exclude = ('polymorphic_ctype',)
 
 
-class OrganizationSerializer(JsonApiSerializer):
+class OrganizationSerializer(PolymorphicJsonApiSerializer):
     class Meta:
         model = BaseOrganization
         exclude = ('polymorphic_ctype',)
-
-    def to_representation(self, instance):
-        # Handle polymorphism
-        if isinstance(instance, Company):
-            return CompanySerializer(
-                instance, context=self.context).to_representation(instance)
-        elif isinstance(instance, Association):
-            return AssociationSerializer(
-                instance, context=self.context).to_representation(instance)
-        return super(OrganizationSerializer, self).to_representation(instance)
+        polymorphic_serializers = {
+            Company: CompanySerializer,
+            Association: "tests.serializers.AssociationSerializer",
+        }
 
 
 class IndividualSerializer(JsonApiSerializer):
@@ -111,3 +115,45 @@ class IndividualSerializer(JsonApiSerializer):
             "organization": OrganizationSerializer(),
             "other_organizations": OrganizationSerializer(),
         }
+
+
+class CategorySerializer(JsonApiSerializer):
+    class Meta:
+        model = Category
+        include = {
+            "parent": "tests.serializers.CategorySerializer",
+        }
+
+
+class PostSerializer(JsonApiSerializer):
+    class Meta:
+        model = Post
+
+
+class VehicleSerializer(PolymorphicJsonApiSerializer):
+    class Meta:
+        model = Vehicle
+        polymorphic_serializers = {
+            Car: "tests.serializers.CarSerializer",
+            Bike: "tests.serializers.BikeSerializer",
+        }
+
+
+class CarSerializer(JsonApiSerializer):
+    class Meta:
+        model = Car
+
+
+class BikeSerializer(JsonApiSerializer):
+    class Meta:
+        model = Bike
+
+
+class GarageSerializer(JsonApiSerializer):
+    class Meta:
+        model = Garage
+        include = {
+            "vehicle": VehicleSerializer(),
+            "vehicles": VehicleSerializer(),
+            "annex": "tests.serializers.GarageSerializer",
+        }
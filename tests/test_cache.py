@@ -0,0 +1,192 @@
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+import pytest
+
+from rest_framework_jsonapi.cache import FragmentCache, get_fragment_cache
+from rest_framework_jsonapi.renderers import JsonApiAdapter, JsonApiRenderer
+from tests.models import Article, Person, Comment
+from tests.serializers import PersonSerializer
+from tests.utils import get_json
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def fragment_cache(request):
+    override = override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, FRAGMENT_CACHE={
+            "MODELS": {
+                "tests.Person": "last_name",
+                "tests.Article": None,
+            },
+        }))
+    override.enable()
+    cache.clear()
+
+    def disable():
+        override.disable()
+        cache.clear()
+    request.addfinalizer(disable)
+
+
+def test_cache_hits_skip_serialization(client, fragment_cache):
+    Person.objects.create(last_name="Davis", first_name="Molly")
+    url = reverse("person-detail", args=[1])
+    _, content = get_json(client, url)
+    # Not sent by `update()`
+    Person.objects.update(first_name="Sid")
+    assert get_json(client, url)[1] == content
+    Person.objects.get().save()
+    _, content = get_json(client, url)
+    assert content["data"]["attributes"]["first-name"] == "Sid"
+
+
+def test_cache_version_field(client, fragment_cache):
+    Person.objects.create(last_name="Davis", first_name="Molly")
+    url = reverse("person-detail", args=[1])
+    get_json(client, url)
+    Person.objects.update(first_name="Sid", last_name="Roe")
+    _, content = get_json(client, url)
+    assert content["data"]["attributes"] == {
+        "first-name": "Sid",
+        "last-name": "Roe",
+        "twitter": "",
+    }
+
+
+def test_cached_included(client, fragment_cache):
+    author = Person.objects.create(last_name="Davis", first_name="Molly")
+    article = Article.objects.create(title="Molly's article", author=author)
+    article.comments.add(Comment.objects.create(body="Great", author=author))
+    url = "{}?include=author,comments".format(reverse("article-list"))
+    _, content = get_json(client, url)
+    assert get_json(client, url)[1] == content
+    assert [item["type"] for item in content["included"]] == [
+        "person", "comment"]
+
+
+def test_many_to_many_invalidation(client, fragment_cache):
+    author = Person.objects.create(last_name="Davis", first_name="Molly")
+    article = Article.objects.create(title="Molly's article", author=author)
+    url = reverse("article-detail", args=[1])
+    get_json(client, url)
+    article.comments.add(Comment.objects.create(body="Great", author=author))
+    _, content = get_json(client, url)
+    assert content["data"]["relationships"]["comments"] == {
+        "data": [{"id": "1", "type": "comment"}]
+    }
+
+
+def test_sparse_fieldsets_are_cached_apart(client, fragment_cache):
+    Person.objects.create(last_name="Davis", first_name="Molly")
+    url = reverse("person-detail", args=[1])
+    get_json(client, url)
+    _, content = get_json(client, "{}?fields[person]=twitter".format(url))
+    assert content["data"]["attributes"] == {"twitter": ""}
+
+
+def test_version_field_is_never_deferred(client, fragment_cache):
+    for name in ("Molly", "Buzz", "Sid"):
+        author = Person.objects.create(last_name="Doe", first_name=name)
+        Article.objects.create(title="{}'s article".format(name),
+                               author=author)
+    url = "{}?include=author&fields[person]=first-name".format(
+        reverse("article-list"))
+    queries, content = get_json(client, url)
+    # Page count, articles joined with their authors, comments linkage
+    assert len(queries) == 3
+    queries, cached_content = get_json(client, url)
+    assert cached_content == content
+    # The linkage of cached articles is read from their fragments and their
+    # authors are kept from the join
+    assert len(queries) == 2
+
+
+def test_fragments_are_read_at_once(client, fragment_cache, monkeypatch):
+    for name in ("Molly", "Buzz", "Sid"):
+        Person.objects.create(last_name="Doe", first_name=name)
+    url = reverse("person-list")
+    _, content = get_json(client, url)
+    calls = []
+    get_many = FragmentCache.get_many
+    get_entry = FragmentCache.get
+    monkeypatch.setattr(FragmentCache, "get_many", lambda self, instances: (
+        calls.append(len(instances)), get_many(self, instances))[1])
+    monkeypatch.setattr(
+        FragmentCache, "get", lambda self, instance, serializer, entries=None:
+        (calls.append(entries is None),
+         get_entry(self, instance, serializer, entries))[1])
+    assert get_json(client, url)[1] == content
+    # One lookup for the page, fragments then read from its entries
+    assert calls[0] == 3
+    assert not any(calls[1:])
+
+
+class RecordingCache(object):
+    """Cache backend proxy recording the methods called."""
+
+    def __init__(self, cache):
+        self.wrapped = cache
+        self.calls = []
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.wrapped, name)
+
+
+def test_fragments_are_written_at_once(client, fragment_cache, monkeypatch):
+    for name in ("Molly", "Buzz", "Sid"):
+        Person.objects.create(last_name="Doe", first_name=name)
+    fragments = get_fragment_cache()
+    recording = RecordingCache(fragments.cache)
+    monkeypatch.setattr(fragments, "cache", recording)
+    url = reverse("person-list")
+    _, content = get_json(client, url)
+    # Misses are known from the lookup of the page
+    assert recording.calls == ["get_many", "set_many"]
+    recording.calls = []
+    assert get_json(client, url)[1] == content
+    assert recording.calls == ["get_many"]
+
+
+def render(serializer):
+    renderer = JsonApiRenderer()
+    renderer.view = None
+    renderer.request = Request(APIRequestFactory().get("/"))
+    return JsonApiAdapter(renderer, serializer.data).serializable_hash()
+
+
+class UserPersonSerializer(PersonSerializer):
+    def get_fragment_variant(self):
+        return self.context["user"]
+
+
+class UncachedPersonSerializer(PersonSerializer):
+    class Meta(PersonSerializer.Meta):
+        cache_fragments = False
+
+
+def test_fragment_variants(fragment_cache):
+    person = Person.objects.create(last_name="Davis", first_name="Molly")
+    serializer = UserPersonSerializer(person, context={"user": 1})
+    render(serializer)
+    fragments = get_fragment_cache()
+    assert fragments.get(person, serializer) is not None
+    assert fragments.get(
+        person, UserPersonSerializer(context={"user": 2})) is None
+
+
+def test_fragment_cache_opt_out(fragment_cache):
+    person = Person.objects.create(last_name="Davis", first_name="Molly")
+    serializer = UncachedPersonSerializer(person)
+    render(serializer)
+    assert not hasattr(serializer.data, "_fragment_instance")
+    assert get_fragment_cache().get(person, serializer) is None
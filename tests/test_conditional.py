@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+import calendar
+import pytest
+
+from tests.models import Post
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_etag_and_last_modified(client):
+    post = Post.objects.create(title="First")
+    response = client.get(reverse("post-list"))
+    assert response.status_code == 200
+    assert response["ETag"].startswith('"')
+    assert response["Last-Modified"] == http_date(
+        calendar.timegm(post.updated_at.utctimetuple()))
+
+
+def test_not_modified_skips_serialization(client):
+    Post.objects.create(title="First")
+    etag = client.get(reverse("post-list"))["ETag"]
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse("post-list"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response["ETag"] == etag
+    assert len(context.captured_queries) == 1
+
+
+def test_etag_changes_with_data(client):
+    post = Post.objects.create(title="First")
+    etag = client.get(reverse("post-list"))["ETag"]
+    Post.objects.create(title="Second")
+    response = client.get(reverse("post-list"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    etag = response["ETag"]
+    post.save()
+    assert client.get(reverse("post-list"), HTTP_IF_NONE_MATCH=etag)[
+        "ETag"] != etag
+
+
+def test_etag_normalized_params(client):
+    Post.objects.create(title="First")
+    url = reverse("post-list")
+    etag = client.get(url + "?fields[post]=title,created")["ETag"]
+
+    def get_status(query):
+        return client.get(url + query, HTTP_IF_NONE_MATCH=etag).status_code
+    assert get_status("?fields[post]=created,title") == 304
+    assert get_status("?fields[post]=title") == 200
+    assert get_status("?page[number]=1&fields[post]=created,title") == 200
+
+
+def test_if_modified_since(client):
+    Post.objects.create(title="First")
+    last_modified = client.get(reverse("post-list"))["Last-Modified"]
+    response = client.get(reverse("post-list"),
+                          HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == 304
+
+
+def test_detail(client):
+    Post.objects.create(title="First")
+    url = reverse("post-detail", args=[1])
+    etag = client.get(url)["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert client.get(reverse("post-detail", args=[2]),
+                      HTTP_IF_NONE_MATCH=etag).status_code == 404
+
+
+def test_any_etag(client):
+    assert client.get(reverse("post-detail", args=[99]),
+                      HTTP_IF_NONE_MATCH="*").status_code == 404
+    assert client.get(reverse("post-list"),
+                      HTTP_IF_NONE_MATCH="*").status_code == 200
+    Post.objects.create(title="First")
+    assert client.get(reverse("post-detail", args=[1]),
+                      HTTP_IF_NONE_MATCH="*").status_code == 304
+
+
+def test_weak_etag(client):
+    Post.objects.create(title="First")
+    url = reverse("post-detail", args=[1])
+    etag = client.get(url)["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH="W/" + etag).status_code == 304
+
+
+def test_not_modified_checks_object_permissions(client):
+    Post.objects.create(title="First")
+    url = reverse("private-post-detail", args=[1])
+    assert client.get(url, HTTP_IF_NONE_MATCH="*").status_code == 403
+    assert client.get(reverse("private-post-detail", args=[2]),
+                      HTTP_IF_NONE_MATCH="*").status_code == 404
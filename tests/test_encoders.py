@@ -0,0 +1,86 @@
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+from django.utils import timezone
+
+import datetime
+import decimal
+import json
+import pytest
+import uuid
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_jsonapi.encoders import JsonApiEncoder
+from rest_framework_jsonapi.renderers import JsonApiRenderer
+from tests.models import Person
+
+
+pytestmark = pytest.mark.django_db
+
+
+def upper_backend(renderer):
+    def dumps(data):
+        return json.dumps(data).upper().encode("utf-8")
+    return dumps
+
+
+def test_encoder_matches_drf():
+    now = timezone.now()
+    values = [
+        now, now.replace(microsecond=0), datetime.datetime(2016, 1, 2, 3, 4),
+        datetime.date(2016, 1, 2), decimal.Decimal("1.5"), uuid.uuid4(),
+    ]
+    assert JsonApiEncoder().encode(values) == JSONEncoder().encode(values)
+
+
+def test_stdlib_backend():
+    renderer = JsonApiRenderer()
+    renderer.encoder_backend = "stdlib"
+    assert renderer.render_member(
+        {"name": " ", "price": decimal.Decimal("2.5")}) in (
+        b'{"name":"\\u2028","price":2.5}', b'{"price":2.5,"name":"\\u2028"}')
+
+
+def test_indent_falls_back_to_drf(client):
+    Person.objects.create(last_name="Davis", first_name="Molly")
+    response = client.get(reverse("person-detail", args=[1]),
+                          HTTP_ACCEPT="application/vnd.api+json; indent=2")
+    assert response.content.decode().startswith('{\n  "jsonapi": {')
+
+
+def test_custom_backend(client):
+    Person.objects.create(last_name="Davis", first_name="Molly")
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK,
+            JSON_ENCODER_BACKEND="tests.test_encoders.upper_backend")):
+        response = client.get(reverse("person-detail", args=[1]))
+    assert b'"FIRST-NAME": "MOLLY"' in response.content
+
+
+def test_invalid_backend(client):
+    Person.objects.create(last_name="Davis", first_name="Molly")
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK,
+            JSON_ENCODER_BACKEND="tests.test_encoders.missing_backend")):
+        with pytest.raises(ImportError) as excinfo:
+            client.get(reverse("person-detail", args=[1]))
+    assert "JSON_ENCODER_BACKEND" in str(excinfo.value)
+
+
+def test_orjson_backend():
+    pytest.importorskip("orjson")
+    renderer = JsonApiRenderer()
+    data = {
+        "name": "Molly", "price": decimal.Decimal("2.5"), "id": uuid.uuid4(),
+        "created": timezone.now(), "day": datetime.date(2016, 1, 2),
+        "counts": {1: "one"}, "big": 2 ** 70,
+    }
+    renderer.encoder_backend = "stdlib"
+    expected = json.loads(renderer.render_member(data).decode())
+    renderer = JsonApiRenderer()
+    renderer.encoder_backend = "orjson"
+    assert json.loads(renderer.render_member(data).decode()) == expected
+    assert renderer.render_member({"name": "\u2028\u2029"}) == \
+        b'{"name":"\\u2028\\u2029"}'
@@ -0,0 +1,153 @@
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import reverse
+
+import datetime
+import json
+import pytest
+
+from tests.models import Article, Person, Post
+
+
+pytestmark = pytest.mark.django_db
+
+
+def create_articles():
+    for first_name, last_name, title in (
+            ("Molly", "Davis", "B"), ("Buzz", "Lightyear", "C"),
+            ("Sid", "Davis", "A"), ("Bo", "Peep", "D")):
+        author = Person.objects.create(
+            first_name=first_name, last_name=last_name)
+        Article.objects.create(title=title, author=author)
+
+
+def get_ids(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [item["id"] for item in json.loads(
+        response.content.decode())["data"]]
+
+
+def test_sort(client):
+    create_articles()
+    url = reverse("article-list")
+    assert get_ids(client, "{}?sort=title".format(url)) == ["3", "1", "2"]
+    assert get_ids(client, "{}?sort=-title".format(url)) == ["4", "2", "1"]
+    assert get_ids(client, "{}?sort=-title&page%5Bnumber%5D=2".format(
+        url)) == ["3"]
+
+
+def test_sort_relationship_paths(client):
+    create_articles()
+    assert get_ids(client, "{}?sort=author.last-name,-author.first-name"
+                   .format(reverse("article-list"))) == ["3", "1", "2"]
+
+
+def test_sort_not_allowed(client):
+    create_articles()
+    response = client.get("{}?sort=title,id".format(reverse("article-list")))
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"] == [{
+        "detail": "Sorting by 'id' is not allowed.",
+        "source": {"parameter": "sort"},
+        "status": "400",
+    }]
+
+
+def test_sort_on_indexes(client):
+    create_articles()
+    url = "{}?page%5Blimit%5D=3".format(reverse("person-list"))
+    # Without allowed sorts, only indexed columns can be sorted on
+    assert get_ids(client, "{}&sort=-id".format(url)) == ["4", "3", "2"]
+    response = client.get("{}&sort=last-name".format(url))
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"][0]["detail"] == \
+        "Sorting by 'last-name' is not allowed."
+
+
+def test_sort_unknown_field(client):
+    response = client.get("{}?sort=author.articles".format(
+        reverse("article-list")))
+    assert response.status_code == 400
+    response = client.get("{}?sort=title,,author".format(
+        reverse("article-list")))
+    assert response.status_code == 400
+
+
+def test_filter(client):
+    create_articles()
+    url = reverse("article-list")
+    assert get_ids(client, "{}?filter[title]=B".format(url)) == ["1"]
+    assert get_ids(client, "{}?filter[title]=B,D".format(url)) == ["1", "4"]
+    assert get_ids(client, "{}?filter[title][in]=C".format(url)) == ["2"]
+    assert get_ids(client, "{}?filter[title][in]=CD".format(url)) == []
+    assert get_ids(client, "{}?filter[title][range]=B,C".format(url)) == [
+        "1", "2"]
+    assert get_ids(client, "{}?filter[id]=2,3&sort=title".format(url)) == [
+        "3", "2"]
+
+
+def test_filter_relationship_paths(client):
+    create_articles()
+    url = reverse("article-list")
+    assert get_ids(client, "{}?filter[author.last-name]=Davis".format(
+        url)) == ["1", "3"]
+    assert get_ids(client, "{}?filter[author]=2,4".format(url)) == [
+        "2", "4"]
+    assert get_ids(client, "{}?filter[author.last-name]=Davis"
+                   "&filter[title]=A".format(url)) == ["3"]
+
+
+def test_filter_errors(client):
+    url = reverse("article-list")
+
+    def get_error(query):
+        response = client.get("{}?{}".format(url, query))
+        assert response.status_code == 400
+        errors = json.loads(response.content.decode())["errors"]
+        assert len(errors) == 1
+        return errors[0]["source"]["parameter"], errors[0]["detail"]
+
+    assert get_error("filter[author.first-name]=Molly") == (
+        "filter[author.first-name]",
+        "Filtering on 'author.first-name' with 'exact' is not allowed.")
+    assert get_error("filter[title][gt]=A") == (
+        "filter[title][gt]",
+        "Filtering on 'title' with 'gt' is not allowed.")
+    assert get_error("filter[title][range]=A") == (
+        "filter[title][range]", "'range' expects 2 value(s).")
+    assert get_error("filter[id]=one") == (
+        "filter[id]", "Invalid value 'one'.")
+    assert get_error("filter[title]]=A") == (
+        "filter[title]]", "Invalid filter parameter.")
+
+
+def create_posts():
+    for day, published in ((1, True), (15, False), (31, True)):
+        Post.objects.create(
+            title="Post", published=published,
+            created=datetime.datetime(2016, 1, day, 12))
+
+
+def test_filter_boolean(client):
+    create_posts()
+    url = reverse("post-list")
+    assert get_ids(client, "{}?filter[published]=true".format(url)) == [
+        "1", "3"]
+    assert get_ids(client, "{}?filter[published]=false".format(url)) == [
+        "2"]
+    response = client.get("{}?filter[published]=maybe".format(url))
+    assert response.status_code == 400
+
+
+def test_filter_date_range(client):
+    create_posts()
+    url = reverse("post-list")
+    assert get_ids(client, "{}?filter[created][range]=2016-01-10,2016-02-01"
+                   .format(url)) == ["2", "3"]
+    assert get_ids(client, "{}?filter[created][gte]=2016-01-31".format(
+        url)) == ["3"]
+    response = client.get("{}?filter[created][gte]=2016-13-01".format(url))
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"][0]["detail"] == \
+        "Invalid value '2016-13-01'."
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
 
+from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 
 import json
 import pytest
@@ -75,3 +77,52 @@ def test_included_query_argument_formatting(client):
             }
         ]
     }
+
+
+def test_camelized_keys(client):
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, KEY_FORMAT="camelize")):
+        response = client.post(reverse("person-list"), data=json.dumps({
+            "data": {
+                "type": "person",
+                "attributes": {
+                    "firstName": "Molly",
+                    "lastName": "Davis",
+                    "twitter": ""
+                }
+            }
+        }), content_type="application/vnd.api+json")
+        assert response.status_code == 201
+        content = json.loads(response.content.decode())
+        assert content["data"]["attributes"] == {
+            "firstName": "Molly",
+            "lastName": "Davis",
+            "twitter": ""
+        }
+        comment = Comment.objects.create(
+            body="Molly's comment", author=Person.objects.get())
+        FormattingWithABBR.objects.create(unique_comment=comment)
+        response = client.get("{}?include=uniqueComment".format(
+            reverse("formatting-detail", args=[1])))
+        content = json.loads(response.content.decode())
+        assert list(content["data"]["relationships"]) == ["uniqueComment"]
+        assert content["included"][0]["id"] == "1"
+
+
+def test_unformatted_keys(client):
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, KEY_FORMAT=None)):
+        response = client.post(reverse("person-list"), data=json.dumps({
+            "data": {
+                "type": "person",
+                "attributes": {
+                    "first_name": "Molly"
+                }
+            }
+        }), content_type="application/vnd.api+json")
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"] == [{
+        "detail": "This field is required.",
+        "source": {"pointer": "/data/attributes/last_name"},
+        "status": "400",
+    }]
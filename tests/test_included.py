@@ -0,0 +1,283 @@
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import json
+import pytest
+
+from rest_framework_jsonapi.serializers import (
+    JsonApiSerializer, JsonApiPrimaryKeyRelatedField)
+from tests.models import (
+    Article, Person, Comment, Category, Label, Labelled)
+from tests.utils import get_json
+
+
+pytestmark = pytest.mark.django_db
+
+
+def create_articles():
+    for name in ("Molly", "Buzz", "Sid"):
+        author = Person.objects.create(last_name="Doe", first_name=name)
+        commenter = Person.objects.create(last_name="Roe", first_name=name)
+        article = Article.objects.create(
+            title="{}'s article".format(name), author=author)
+        article.comments.add(
+            Comment.objects.create(body="First", author=commenter),
+            Comment.objects.create(body="Second", author=commenter))
+
+
+def test_included_are_loaded_along_with_primary_data(client):
+    create_articles()
+    queries, content = get_json(
+        client, "{}?include=author,comments,comments.author".format(
+            reverse("article-list")))
+    # Page count, articles joined with their authors, and prefetched
+    # comments joined with their authors
+    assert len(queries) == 3
+    assert len(content["included"]) == 12
+
+
+def test_included_are_planned_per_relation(client):
+    create_articles()
+    queries, _ = get_json(
+        client, "{}?include=author".format(reverse("article-list")))
+    # Comments linkage isn't prefetched when comments aren't included, it
+    # is read for the whole page from the through table
+    assert len(queries) == 3
+
+
+def test_nested_included_keep_document_order(client):
+    create_articles()
+    response = client.get("{}?include=author,comments,comments.author".format(
+        reverse("article-list")))
+    content = json.loads(response.content.decode())
+    assert [(item["type"], item["id"]) for item in content["included"]] == [
+        ("person", "1"), ("person", "3"), ("person", "5"),
+        ("comment", "1"), ("comment", "2"), ("comment", "3"),
+        ("comment", "4"), ("comment", "5"), ("comment", "6"),
+        ("person", "2"), ("person", "4"), ("person", "6"),
+    ]
+
+
+def test_included_are_distinct_across_paths(client):
+    molly = Person.objects.create(last_name="Davis", first_name="Molly")
+    article = Article.objects.create(title="Molly's article", author=molly)
+    article.comments.add(
+        Comment.objects.create(body="First", author=molly),
+        Comment.objects.create(body="Second", author=molly))
+    response = client.get("{}?include=author,comments.author".format(
+        reverse("article-detail", args=[article.pk])))
+    content = json.loads(response.content.decode())
+    assert [(item["type"], item["id"]) for item in content["included"]] == [
+        ("person", "1"),
+    ]
+
+
+def test_to_one_linkage_is_read_from_the_column(client):
+    create_articles()
+    url = reverse("comment-list")
+    base_queries, _ = get_json(client, url)
+    # Authors aren't loaded to render the linkage
+    assert len(base_queries) == 1
+    queries, content = get_json(client, "{}?include=author".format(url))
+    # Included authors are fetched in a single batch
+    assert len(queries) == len(base_queries) + 1
+    assert len(content["included"]) == 2
+
+
+def test_included_reuse_related_instances(client):
+    create_articles()
+    url = reverse("article-list")
+    with CaptureQueriesContext(connection) as context:
+        response = client.get("{}?include=author".format(url))
+    # Authors loaded along with the articles aren't fetched again
+    assert not [query for query in context.captured_queries
+                if query["sql"].startswith('SELECT "tests_person"')]
+    assert len(json.loads(response.content.decode())["included"]) == 3
+
+
+def test_primary_data_is_not_included(client):
+    root = Category.objects.create(name="Root")
+    child = Category.objects.create(name="Child", parent=root)
+    Category.objects.create(name="Grandchild", parent=child)
+    response = client.get("{}?include=parent,parent.parent".format(
+        reverse("category-list")))
+    content = json.loads(response.content.decode())
+    assert [item["id"] for item in content["data"]] == ["1", "2", "3"]
+    assert content["included"] == []
+
+
+def test_included_are_serialized_once(client):
+    root = Category.objects.create(name="Root")
+    child = Category.objects.create(name="Child", parent=root)
+    Category.objects.create(name="Grandchild", parent=child)
+    response = client.get("{}?include=parent,parent.parent".format(
+        reverse("category-detail", args=[3])))
+    content = json.loads(response.content.decode())
+    assert content["included"] == [
+        {
+            "id": "2",
+            "type": "category",
+            "attributes": {
+                "name": "Child"
+            },
+            "relationships": {
+                "parent": {
+                    "data": {"id": "1", "type": "category"}
+                }
+            }
+        },
+        {
+            "id": "1",
+            "type": "category",
+            "attributes": {
+                "name": "Root"
+            },
+            "relationships": {
+                "parent": {
+                    "data": None
+                }
+            }
+        }
+    ]
+
+
+def test_include_not_allowed(client):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get("{}?include=children".format(
+            reverse("budgeted-category-list")))
+    assert response.status_code == 400
+    assert len(context.captured_queries) == 0
+    assert json.loads(response.content.decode())["errors"] == [{
+        "detail": "Including 'children' is not allowed.",
+        "source": {"parameter": "include"},
+        "status": "400",
+    }]
+
+
+def test_include_too_deep(client):
+    response = client.get("{}?include=parent.parent.parent".format(
+        reverse("budgeted-category-list")))
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"] == [{
+        "detail": "Include path 'parent.parent.parent' exceeds the maximum "
+                  "depth of 2.",
+        "source": {"parameter": "include"},
+        "status": "400",
+    }]
+
+
+def test_too_many_included(client):
+    first = Category.objects.create(name="First")
+    second = Category.objects.create(name="Second")
+    Category.objects.create(name="Child", parent=first)
+    Category.objects.create(name="Child", parent=second)
+    url = reverse("budgeted-category-detail", args=[3])
+    response = client.get("{}?include=parent".format(url))
+    assert response.status_code == 200
+    response = client.get("{}?include=parent".format(
+        reverse("budgeted-category-list")))
+    # Parents of the page are the primary data and aren't sideloaded
+    assert response.status_code == 200
+    response = client.get("{}?include=parent.parent".format(url))
+    assert response.status_code == 200
+    Category.objects.filter(pk=1).update(parent=second)
+    response = client.get("{}?include=parent,parent.parent".format(url))
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"] == [{
+        "detail": "Too many included resources, the maximum is 1.",
+        "source": {"parameter": "include"},
+        "status": "400",
+    }]
+    # Intermediate resources are fetched, and count
+    response = client.get("{}?include=parent.parent".format(url))
+    assert response.status_code == 400
+
+
+def test_too_many_included_in_streamed_list(client):
+    for name in ("First", "Second", "Third"):
+        Category.objects.create(name=name)
+    Category.objects.create(name="Child", parent_id=1)
+    Category.objects.create(name="Child", parent_id=1)
+    url = "{}?include=parent&page[number]=2".format(
+        reverse("streamed-budgeted-category-list"))
+    response = client.get(url)
+    assert response.status_code == 200
+    Category.objects.filter(pk=5).update(parent=2)
+    response = client.get(url)
+    # Rejected before anything is streamed
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"] == [{
+        "detail": "Too many included resources, the maximum is 1.",
+        "source": {"parameter": "include"},
+        "status": "400",
+    }]
+
+
+def test_to_many_linkage_is_read_per_page(client):
+    create_articles()
+    Article.objects.get(pk=2).comments.add(Comment.objects.get(pk=1))
+    queries, content = get_json(client, reverse("article-list"))
+    # Page count, articles, and the comments linkage of the page
+    assert len(queries) == 3
+    assert [[item["id"] for item in resource["relationships"]["comments"][
+        "data"]] for resource in content["data"]] == [
+        ["1", "2"], ["3", "4", "1"], ["5", "6"]]
+
+
+class CommentArticlesSerializer(JsonApiSerializer):
+    class Meta:
+        model = Comment
+        fields = ("id", "article_set")
+
+
+def test_reverse_to_many_linkage_is_read_per_page():
+    create_articles()
+    with CaptureQueriesContext(connection) as context:
+        data = CommentArticlesSerializer(
+            Comment.objects.all(), many=True).data
+    # Comments, and the articles linkage of the page
+    assert len(context.captured_queries) == 2
+    assert [[item["id"] for item in comment["article_set"]]
+            for comment in data] == [[1], [1], [2], [2], [3], [3]]
+
+
+def test_prefetched_reverse_to_many_linkage_is_read_as_is():
+    create_articles()
+    with CaptureQueriesContext(connection) as context:
+        data = CommentArticlesSerializer(
+            Comment.objects.prefetch_related("article_set"), many=True).data
+    # Comments, and the prefetched articles (cached as `article`)
+    assert len(context.captured_queries) == 2
+    assert [[item["id"] for item in comment["article_set"]]
+            for comment in data] == [[1], [1], [2], [2], [3], [3]]
+
+
+class LabelledSerializer(JsonApiSerializer):
+    # Instead of the default `SlugRelatedField`
+    label = JsonApiPrimaryKeyRelatedField(queryset=Label.objects.all())
+
+    class Meta:
+        model = Labelled
+
+
+class LabelSerializer(JsonApiSerializer):
+    labelled_set = JsonApiPrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Label
+        fields = ("id", "labelled_set")
+
+
+def test_linkage_of_foreign_keys_to_other_fields():
+    labels = [Label.objects.create(code=code) for code in ("b", "a")]
+    for label in labels:
+        Labelled.objects.create(label=label)
+    # The column holds the code, the linkage has the primary key
+    assert [item["label"]["id"] for item in LabelledSerializer(
+        Labelled.objects.all(), many=True).data] == [1, 2]
+    assert [[item["id"] for item in label["labelled_set"]]
+            for label in LabelSerializer(
+                Label.objects.all(), many=True).data] == [[1], [2]]
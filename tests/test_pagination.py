@@ -1,12 +1,24 @@
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.six.moves.urllib.parse import urlencode
 
+import base64
+import datetime
 import json
 import pytest
 import rest_framework
 
-from tests.models import Article, Person, Comment
+from rest_framework_jsonapi.pagination import (
+    PageNumberPagination, CursorPagination)
+from tests.models import Article, Person, Comment, Post
+from tests.utils import get_json
 
 
 pytestmark = pytest.mark.django_db
@@ -401,3 +413,225 @@ def test_cursor_and_sideloading(client):
         "&page%5Bcursor%5D=cD00JnI9MQ%3D%3D",
     ]
     assert response_data["links"]["next"] is None
+
+
+def test_paginated_document_members(client):
+    for name in ("Molly", "Buzz", "Sid", "Bo"):
+        author = Person.objects.create(last_name="Doe", first_name=name)
+        Comment.objects.create(body="{}'s comment".format(name), author=author)
+    response = client.get("{}?include=author".format(reverse("comment-list")))
+    content = json.loads(response.content.decode(),
+                         object_pairs_hook=OrderedDict)
+    assert list(content) == ["links", "jsonapi", "data", "included"]
+    assert [item["id"] for item in content["data"]] == ["1", "2", "3"]
+    assert [item["id"] for item in content["included"]] == ["1", "2", "3"]
+
+
+def create_people(count):
+    for index in range(count):
+        person = Person.objects.create(
+            last_name="Doe", first_name="Person {}".format(index))
+        Article.objects.create(title="Article {}".format(index),
+                               author=person)
+
+
+def get_counted(client, url, count_mode):
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, PAGINATION_COUNT_MODE=count_mode)):
+        queries, content = get_json(client, url)
+    counts = [query for query in queries if "COUNT(" in query["sql"]]
+    return len(counts), content
+
+
+def test_page_number_without_count(client):
+    create_people(4)
+    counts, content = get_counted(client, reverse("article-list"), "none")
+    assert counts == 0
+    assert "meta" not in content
+    assert content["links"] == {
+        "first": "http://testserver/articles",
+        "last": "http://testserver/articles?page%5Bnumber%5D=last",
+        "prev": None,
+        "next": "http://testserver/articles?page%5Bnumber%5D=2"
+    }
+    counts, content = get_counted(
+        client, content["links"]["next"], "none")
+    assert counts == 0
+    assert content["links"]["next"] is None
+    assert [item["id"] for item in content["data"]] == ["4"]
+    # The last page is resolved with an exact count
+    counts, content = get_counted(
+        client, "{}?page%5Bnumber%5D=last".format(reverse("article-list")),
+        "none")
+    assert counts == 1
+    assert content["meta"] == {"count": 4, "total-pages": 2}
+    assert [item["id"] for item in content["data"]] == ["4"]
+
+
+def test_full_last_page_number_without_count(client):
+    create_people(6)
+    counts, content = get_counted(
+        client, "{}?page%5Bnumber%5D=2".format(reverse("article-list")),
+        "none")
+    assert content["links"]["next"] is None
+    assert [item["id"] for item in content["data"]] == ["4", "5", "6"]
+
+
+def test_page_number_out_of_range_without_count(client):
+    create_people(4)
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, PAGINATION_COUNT_MODE="none")):
+        response = client.get("{}?page%5Bnumber%5D=3".format(
+            reverse("article-list")))
+    assert response.status_code == 404
+
+
+def test_cached_count(client):
+    cache.clear()
+    create_people(4)
+    counts, content = get_counted(client, reverse("article-list"), "cached")
+    assert counts == 1
+    assert content["meta"] == {"count": 4, "total-pages": 2}
+    assert content["links"]["last"].endswith("page%5Bnumber%5D=2")
+    counts, content = get_counted(client, reverse("article-list"), "cached")
+    assert counts == 0
+    assert content["meta"] == {"count": 4, "total-pages": 2}
+    assert content["links"]["last"].endswith("page%5Bnumber%5D=last")
+    # Keyed by the SQL of the queryset
+    counts, _ = get_counted(
+        client, "{}?page%5Blimit%5D=2".format(reverse("person-list")),
+        "cached")
+    assert counts == 1
+
+
+def test_estimated_count():
+    create_people(4)
+    pagination = PageNumberPagination()
+    pagination.count_mode = "estimated"
+    # No estimate with SQLite
+    assert pagination.get_count(Article.objects.all(), None) == (4, True)
+    pagination.get_estimated_count = lambda queryset: 5000
+    assert pagination.get_count(Article.objects.all(), None) == (5000, False)
+    # Small tables are counted
+    pagination.get_estimated_count = lambda queryset: 500
+    assert pagination.get_count(Article.objects.all(), None) == (4, True)
+
+
+def test_invalid_count_mode():
+    pagination = PageNumberPagination()
+    pagination.count_mode = "approximate"
+    with pytest.raises(ValueError):
+        pagination.get_count(Article.objects.all(), None)
+
+
+def test_limit_offset_without_count(client):
+    create_people(4)
+    url = "{}?page%5Blimit%5D=2".format(reverse("person-list"))
+    counts, content = get_counted(client, url, "none")
+    assert counts == 0
+    assert "meta" not in content
+    assert content["links"] == {
+        "prev": None,
+        "next": "http://testserver/people?page%5Blimit%5D=2"
+                "&page%5Boffset%5D=2"
+    }
+    counts, content = get_counted(
+        client, "{}&page%5Boffset%5D=3".format(url), "none")
+    assert content["links"]["next"] is None
+    assert [item["id"] for item in content["data"]] == ["4"]
+
+
+def test_full_last_page_without_count(client):
+    create_people(4)
+    url = "{}?page%5Blimit%5D=2&page%5Boffset%5D=2".format(
+        reverse("person-list"))
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, PAGINATION_COUNT_MODE="none")):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+    content = json.loads(response.content.decode())
+    # One more row than the limit tells there is no next page
+    assert [query["sql"].split(" LIMIT ")[1]
+            for query in context.captured_queries] == ["3 OFFSET 2"]
+    assert content["links"]["next"] is None
+    assert [item["id"] for item in content["data"]] == ["3", "4"]
+
+
+def create_posts():
+    created = datetime.datetime(2016, 1, 1)
+    for index, title in enumerate(("E", "B", "D", "A", "C", "F", "G")):
+        Post.objects.create(
+            title=title,
+            created=created + datetime.timedelta(days=index % 3))
+
+
+def test_cursor_sort(client):
+    create_posts()
+    url = "{}?sort=-created,title".format(reverse("cursor-post-list"))
+    titles = []
+    while url:
+        content = json.loads(client.get(url).content.decode())
+        titles.append([item["attributes"]["title"]
+                       for item in content["data"]])
+        url = content["links"]["next"]
+    assert titles == [["D", "F", "B"], ["C", "A", "E"], ["G"]]
+    # And back
+    titles = []
+    url = content["links"]["prev"]
+    while url:
+        content = json.loads(client.get(url).content.decode())
+        titles.append([item["attributes"]["title"]
+                       for item in content["data"]])
+        url = content["links"]["prev"]
+    assert titles == [["C", "A", "E"], ["D", "F", "B"]]
+
+
+def test_cursor_sort_ties_broken_by_pk(client):
+    create_posts()
+    Post.objects.update(title="Same")
+    url = "{}?sort=-created,title".format(reverse("cursor-post-list"))
+    ids = []
+    while url:
+        content = json.loads(client.get(url).content.decode())
+        ids.extend(item["id"] for item in content["data"])
+        url = content["links"]["next"]
+    # The primary key follows the direction of the last sort field
+    assert ids == ["3", "6", "2", "5", "1", "4", "7"]
+
+
+def test_cursor_sort_must_be_indexed(client):
+    response = client.get("{}?sort=title".format(
+        reverse("cursor-post-list")))
+    assert response.status_code == 400
+    assert json.loads(response.content.decode())["errors"][0]["source"] == {
+        "parameter": "sort"}
+    response = client.get("{}?sort=body".format(
+        reverse("cursor-post-list")))
+    assert response.status_code == 400
+
+
+def test_invalid_cursor(client):
+    create_posts()
+    response = client.get("{}?sort=-created,title&page%5Bcursor%5D=cD0z"
+                          .format(reverse("cursor-post-list")))
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("position", [
+    '["abc", "x", "1"]', '[{"a": 1}, "x", "1"]', '[1, "x", "1"]'])
+def test_tampered_cursor(client, position):
+    create_posts()
+    cursor = base64.b64encode(urlencode({"p": position}).encode(
+        "ascii")).decode("ascii")
+    response = client.get(reverse("cursor-post-list"), {
+        "sort": "-created,title", "page[cursor]": cursor})
+    assert response.status_code == 404
+
+
+def test_float_positions_keep_their_precision():
+    class Row(object):
+        score = 0.1 + 0.2
+
+    position = CursorPagination()._get_position_from_instance(
+        Row(), ["-score"])
+    assert float(position) == 0.1 + 0.2
@@ -1,11 +1,18 @@
 from __future__ import unicode_literals
 
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 import json
 import pytest
 
-from tests.models import Individual, Company, Association
+from rest_framework_jsonapi.renderers import JsonApiAdapter, JsonApiRenderer
+from tests.models import (
+    Individual, BaseOrganization, Company, Association, Vehicle, Car, Bike,
+    Garage)
+from tests.serializers import (
+    OrganizationSerializer, VehicleSerializer, GarageSerializer)
 
 
 pytestmark = pytest.mark.django_db
@@ -102,3 +109,134 @@ def test_person_with_sideloaded_data(client):
             },
         ]
     }
+
+
+def test_child_serializers_are_instantiated_once():
+    Company.objects.create(name='Company 1')
+    Company.objects.create(name='Company 2')
+    Association.objects.create(name='Association')
+    serializer = OrganizationSerializer(
+        BaseOrganization.objects.all(), many=True)
+    data = serializer.data
+    assert [item["_drf_jsonapi_type"] for item in data] == [
+        "company", "company", "association"]
+    assert len(serializer.child.child_serializers) == 2
+    assert data[0]._serializer is data[1]._serializer
+
+
+def test_included_are_loaded_per_subtype():
+    Company.objects.create(name='Company 1')
+    Association.objects.create(name='Association')
+    Company.objects.create(name='Company 2')
+    adapter = JsonApiAdapter(
+        JsonApiRenderer(), [], serializer=OrganizationSerializer())
+    with CaptureQueriesContext(connection) as context:
+        instances = adapter.get_included_instances(
+            [1, 2, 3], OrganizationSerializer(),
+            types=["company", "association", "company"])
+    assert len(context.captured_queries) == 2
+    assert [type(instance) for instance in instances] == [
+        Company, Association, Company]
+
+
+def test_multi_table_inheritance():
+    Car.objects.create(name="Car", doors=2)
+    Bike.objects.create(name="Bike")
+    Vehicle.objects.create(name="Vehicle")
+    with CaptureQueriesContext(connection) as context:
+        data = VehicleSerializer(Vehicle.objects.all(), many=True).data
+    # Vehicles, then one query per mapped model
+    assert len(context.captured_queries) == 3
+    assert [dict(item) for item in data] == [
+        {"id": 1, "name": "Car", "doors": 2, "_drf_jsonapi_type": "car"},
+        {"id": 2, "name": "Bike", "_drf_jsonapi_type": "bike"},
+        {"id": 3, "name": "Vehicle", "_drf_jsonapi_type": "vehicle"},
+    ]
+
+
+def test_included_through_relations_are_downcasted(client):
+    car = Car.objects.create(name="Car", doors=2)
+    bike = Bike.objects.create(name="Bike")
+    vehicle = Vehicle.objects.create(name="Vehicle")
+    garage1 = Garage.objects.create(name="Garage 1", vehicle=car)
+    garage1.vehicles.add(car, bike)
+    garage2 = Garage.objects.create(name="Garage 2", vehicle=bike)
+    garage2.vehicles.add(vehicle)
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(
+            "{}?include=vehicle,vehicles".format(reverse("garage-list")))
+    # Count, garages with their vehicle, vehicles, the types of the vehicles
+    # per mapped model, and the included vehicles per mapped model and batch
+    assert len(context.captured_queries) == 9
+    content = json.loads(response.content.decode())
+    assert [item["relationships"] for item in content["data"]] == [
+        {
+            "vehicle": {"data": {"id": "1", "type": "car"}},
+            "vehicles": {"data": [
+                {"id": "1", "type": "car"}, {"id": "2", "type": "bike"}]},
+            "annex": {"data": None},
+        },
+        {
+            "vehicle": {"data": {"id": "2", "type": "bike"}},
+            "vehicles": {"data": [{"id": "3", "type": "vehicle"}]},
+            "annex": {"data": None},
+        },
+    ]
+    assert content["included"] == [
+        {"id": "1", "type": "car", "attributes": {"name": "Car", "doors": 2}},
+        {"id": "2", "type": "bike", "attributes": {"name": "Bike"}},
+        {"id": "3", "type": "vehicle", "attributes": {"name": "Vehicle"}},
+    ]
+
+
+def test_relations_to_subtypes_without_include(client):
+    car = Car.objects.create(name="Car", doors=2)
+    bike = Bike.objects.create(name="Bike")
+    garage = Garage.objects.create(name="Garage", vehicle=car)
+    garage.vehicles.add(car, bike)
+    response = client.get(reverse("garage-detail", args=[garage.pk]))
+    content = json.loads(response.content.decode())
+    assert content["data"]["relationships"] == {
+        "vehicle": {"data": {"id": "1", "type": "car"}},
+        "vehicles": {"data": [
+            {"id": "1", "type": "car"}, {"id": "2", "type": "bike"}]},
+        "annex": {"data": None},
+    }
+    assert "included" not in content
+
+
+def test_linkage_types_of_included_are_resolved_per_batch(client):
+    car = Car.objects.create(name="Car", doors=2)
+    bike = Bike.objects.create(name="Bike")
+    garages = [Garage.objects.create(name="Garage") for index in range(3)]
+    annexes = [Garage.objects.create(name="Annex", vehicle=vehicle)
+               for vehicle in (car, bike, car)]
+    for garage, annex in zip(garages, annexes):
+        garage.annex = annex
+        garage.save()
+    with CaptureQueriesContext(connection) as context:
+        response = client.get("{}?include=annex".format(
+            reverse("garage-list")))
+    content = json.loads(response.content.decode())
+    assert [(item["id"], item["relationships"]["vehicle"]["data"])
+            for item in content["included"]] == [
+        ("4", {"id": "1", "type": "car"}), ("5", {"id": "2", "type": "bike"}),
+        ("6", {"id": "1", "type": "car"})]
+    # The vehicles of the included annexes are typed at once
+    assert len([query for query in context.captured_queries
+                if 'FROM "tests_car"' in query["sql"]]) == 1
+
+
+def test_linkage_types_are_resolved_by_the_renderer():
+    car = Car.objects.create(name="Car", doors=2)
+    for index in range(3):
+        Garage.objects.create(name="Garage", vehicle=car)
+    # Included serializers are shared across requests and keep no types
+    serializer = GarageSerializer()
+    with CaptureQueriesContext(connection) as context:
+        data = [serializer.to_representation(garage)
+                for garage in Garage.objects.all()]
+    # Garages and their vehicles
+    assert len(context.captured_queries) == 4
+    assert [item["vehicle"]["_drf_jsonapi_type"] for item in data] == [
+        "vehicle"] * 3
@@ -0,0 +1,83 @@
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import reverse
+
+import pytest
+
+from tests.models import Article, Person, Comment
+from tests.utils import get_json
+
+
+pytestmark = pytest.mark.django_db
+
+
+def create_article():
+    author = Person.objects.create(last_name="Davis", first_name="Molly")
+    article = Article.objects.create(title="Molly's article", author=author)
+    article.comments.add(Comment.objects.create(body="Great", author=author))
+    return article
+
+
+def test_primary_fieldset(client):
+    create_article()
+    queries, content = get_json(client, "{}?fields[article]=title".format(
+        reverse("article-list")))
+    assert content["data"] == [{
+        "id": "1",
+        "type": "article",
+        "attributes": {
+            "title": "Molly's article"
+        }
+    }]
+    # Relationships left out aren't serialized
+    assert len(queries) == 2
+
+
+def test_primary_columns_are_deferred(client):
+    create_article()
+    queries, content = get_json(client, "{}?fields[article]=author".format(
+        reverse("article-list")))
+    assert content["data"] == [{
+        "id": "1",
+        "type": "article",
+        "relationships": {
+            "author": {
+                "data": {"id": "1", "type": "person"}
+            }
+        }
+    }]
+    assert "title" not in queries[-1]["sql"]
+
+
+def test_included_fieldsets(client):
+    create_article()
+    queries, content = get_json(
+        client, "{}?include=author,comments,comments.author"
+        "&fields[article]=author,comments"
+        "&fields[person]=first-name&fields[comment]=author".format(
+            reverse("article-list")))
+    assert content["included"] == [{
+        "id": "1",
+        "type": "person",
+        "attributes": {
+            "first-name": "Molly"
+        }
+    }, {
+        "id": "1",
+        "type": "comment",
+        "relationships": {
+            "author": {
+                "data": {"id": "1", "type": "person"}
+            }
+        }
+    }]
+    assert not [query for query in queries if "body" in query["sql"] or
+                "last_name" in query["sql"]]
+
+
+def test_included_are_left_out_with_their_relationship(client):
+    create_article()
+    _, content = get_json(
+        client, "{}?include=author&fields[article]=title".format(
+            reverse("article-list")))
+    assert "included" not in content
@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import reverse
+
+import json
+import pytest
+
+from tests.models import Article, Person, Comment
+
+
+pytestmark = pytest.mark.django_db
+
+
+def get_streamed_content(response):
+    assert response.streaming
+    assert response["Content-Type"] == "application/vnd.api+json"
+    return json.loads(b"".join(response.streaming_content).decode())
+
+
+def resource_key(resource):
+    return resource["type"], int(resource["id"])
+
+
+def test_streamed_list_with_sideloaded_data(client):
+    for name in ("Molly", "Buzz", "Sid"):
+        author = Person.objects.create(last_name="Doe", first_name=name)
+        article = Article.objects.create(
+            title="{}'s article".format(name), author=author)
+        article.comments.add(
+            Comment.objects.create(body="First", author=author),
+            Comment.objects.create(body="Second", author=author))
+    include = "?include=author,comments,comments.author"
+    response = client.get(reverse("streamed-article-list") + include)
+    expected = client.get(reverse("article-list") + include)
+    content = get_streamed_content(response)
+    expected_content = json.loads(expected.content.decode())
+    assert content["data"] == expected_content["data"]
+    # Included resources are sideloaded chunk by chunk
+    assert sorted(content["included"], key=resource_key) == sorted(
+        expected_content["included"], key=resource_key)
+
+
+def test_empty_streamed_list(client):
+    response = client.get(reverse("streamed-article-list"))
+    assert get_streamed_content(response) == {
+        "jsonapi": {
+            "version": "1.0"
+        },
+        "data": []
+    }
+
+
+def test_streamed_page(client):
+    for name in ("Molly", "Buzz", "Sid", "Bo"):
+        Person.objects.create(last_name="Doe", first_name=name)
+    response = client.get(reverse("streamed-person-list"))
+    expected = client.get(reverse("person-list"))
+    content = get_streamed_content(response)
+    expected_content = json.loads(expected.content.decode())
+    assert content["links"]["next"] == expected_content["links"]["next"].\
+        replace("/people", "/streamed-people")
+    assert content["meta"] == expected_content["meta"]
+    assert content["data"] == expected_content["data"]
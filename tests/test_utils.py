@@ -1,11 +1,15 @@
 from __future__ import unicode_literals
 
+from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 
 import json
 import pytest
 
+from rest_framework_jsonapi.utils import parse_include, get_field_plan
 from tests.models import Person, Comment
+from tests.serializers import ArticleSerializer
 
 
 pytestmark = pytest.mark.django_db
@@ -15,11 +19,12 @@ def obvious_resource_type(model):
     return 'object'
 
 
-def test_valid_get_resource_type(client, settings):
-    settings.REST_FRAMEWORK.update(
-        RESOURCE_TYPE_EXTRACTOR="tests.test_utils.obvious_resource_type")
+def test_valid_get_resource_type(client):
     Person.objects.create(last_name="Davis", first_name="Molly")
-    response = client.get(reverse("person-detail", args=[1]))
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK,
+            RESOURCE_TYPE_EXTRACTOR="tests.test_utils.obvious_resource_type")):
+        response = client.get(reverse("person-detail", args=[1]))
     assert json.loads(response.content.decode()) == {
         "jsonapi": {
             "version": "1.0"
@@ -34,16 +39,17 @@ def test_valid_get_resource_type(client, settings):
             }
         }
     }
-    settings.REST_FRAMEWORK.pop("RESOURCE_TYPE_EXTRACTOR")
+    response = client.get(reverse("person-detail", args=[1]))
+    assert json.loads(response.content.decode())["data"]["type"] == "person"
 
 
-def test_invalid_get_resource_type(client, settings):
-    settings.REST_FRAMEWORK.update(
-        RESOURCE_TYPE_EXTRACTOR="tests.test_utils.noop")
+def test_invalid_get_resource_type(client):
     Person.objects.create(last_name="Davis", first_name="Molly")
-    with pytest.raises(ImportError):
-        client.get(reverse("person-detail", args=[1]))
-    settings.REST_FRAMEWORK.pop("RESOURCE_TYPE_EXTRACTOR")
+    with override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK,
+            RESOURCE_TYPE_EXTRACTOR="tests.test_utils.noop")):
+        with pytest.raises(ImportError):
+            client.get(reverse("person-detail", args=[1]))
 
 
 def test_valid_import_serializer(client, settings):
@@ -58,3 +64,21 @@ def test_invalid_import_serializer(client, settings):
     Comment.objects.create(body="Buzz' comment", author=buzz)
     with pytest.raises(ImportError):
         client.get(reverse("invalid-lazy-comment-detail", args=[1]))
+
+
+def test_parse_include():
+    tree = parse_include("author,comments.author,,authors")
+    assert list(tree.paths()) == [
+        ("author",), ("comments", "author"), ("authors",)]
+    assert tree["author"].included and not tree["author"]
+    assert not tree["comments"].included
+    assert tree["comments"]["author"].included
+    assert parse_include(None) == {}
+
+
+def test_field_plan():
+    plan = get_field_plan(ArticleSerializer())
+    assert plan is get_field_plan(ArticleSerializer())
+    assert plan.attributes == [("title", "title")]
+    assert plan.relationships == [
+        ("author", "author", False), ("comments", "comments", True)]
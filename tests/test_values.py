@@ -0,0 +1,98 @@
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import reverse
+
+import pytest
+
+from rest_framework_jsonapi.cache import get_fragment_cache
+from rest_framework_jsonapi.serializers import get_values_plan
+from rest_framework_jsonapi.utils import get_deferred_fields
+from tests.models import Person, Comment
+from tests.serializers import ArticleSerializer, ValuesCommentSerializer
+from tests.utils import get_json
+
+
+pytestmark = pytest.mark.django_db
+
+
+def create_comments():
+    author = Person.objects.create(last_name="Davis", first_name="Molly")
+    Comment.objects.create(body="First", author=author)
+    Comment.objects.create(body="Second", author=author)
+
+
+def test_values_plan():
+    plan = get_values_plan(ValuesCommentSerializer())
+    assert plan.columns == ["id", "body", "author_id"]
+
+
+def test_plans_survive_new_fieldsets():
+    plan = get_values_plan(ValuesCommentSerializer())
+    fragment_cache = get_fragment_cache()
+    get_deferred_fields(ValuesCommentSerializer, frozenset(["new"]))
+    assert get_values_plan(ValuesCommentSerializer()) is plan
+    assert get_fragment_cache() is fragment_cache
+
+
+def test_values_plan_fallback():
+    # Not opted in
+    assert get_values_plan(ArticleSerializer()) is None
+
+    class ValuesArticleSerializer(ArticleSerializer):
+        class Meta(ArticleSerializer.Meta):
+            read_from_values = True
+
+    # Comments are a to-many relation
+    assert get_values_plan(ValuesArticleSerializer()) is None
+
+
+def test_values_list(client):
+    create_comments()
+    queries, content = get_json(client, "{}?include=author".format(
+        reverse("values-comment-list")))
+    assert content["data"] == [{
+        "id": "1",
+        "type": "comment",
+        "attributes": {"body": "First"},
+        "relationships": {
+            "author": {"data": {"id": "1", "type": "person"}}
+        }
+    }, {
+        "id": "2",
+        "type": "comment",
+        "attributes": {"body": "Second"},
+        "relationships": {
+            "author": {"data": {"id": "1", "type": "person"}}
+        }
+    }]
+    assert content["included"] == [{
+        "id": "1",
+        "type": "person",
+        "attributes": {
+            "first-name": "Molly",
+            "last-name": "Davis",
+            "twitter": ""
+        }
+    }]
+    # Page count, rows, and included authors
+    assert len(queries) == 3
+    assert '"tests_person"' not in queries[1]["sql"]
+
+
+def test_values_list_matches_regular_serialization(client):
+    create_comments()
+    _, content = get_json(client, reverse("values-comment-list"))
+    _, detail = get_json(client, reverse("values-comment-detail", args=[1]))
+    assert content["data"][0] == detail["data"]
+
+
+def test_values_list_sparse_fieldset(client):
+    create_comments()
+    queries, content = get_json(client, "{}?fields[comment]=body".format(
+        reverse("values-comment-list")))
+    assert content["data"][0] == {
+        "id": "1",
+        "type": "comment",
+        "attributes": {"body": "First"},
+    }
+    assert "author_id" not in queries[1]["sql"]
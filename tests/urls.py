@@ -4,22 +4,31 @@ from django.conf.urls import url
 from rest_framework import routers
 
 from tests.views import (
-    Articles, People, AuthenticatedPeople, BypassedExceptionHandlerPeople,
-    Comments, OnlyComments, ValidLazyComments, InvalidLazyComments,
+    Articles, StreamedArticles, People, StreamedPeople, AuthenticatedPeople,
+    BypassedExceptionHandlerPeople, Comments, ValuesComments, OnlyComments,
+    ValidLazyComments, InvalidLazyComments,
     ImproperlyConfiguredReadOnlyAuthorComments, ReadOnlyAuthorComments,
-    FormattingWithABBRs, Individuals, throttled_view, validation_error_view,
-    errored_view
+    FormattingWithABBRs, Individuals, Categories, BudgetedCategories,
+    StreamedBudgetedCategories, Posts,
+    CursorPosts, PrivatePosts, Garages,
+    throttled_view, validation_error_view, errored_view
 )
 
 
 router = routers.DefaultRouter(trailing_slash=False)
 
 router.register(r"articles", Articles)
+router.register(r"streamed-articles", StreamedArticles,
+                base_name="streamed-article")
 router.register(r"people", People)
+router.register(r"streamed-people", StreamedPeople,
+                base_name="streamed-person")
 router.register(r"auth-people", AuthenticatedPeople, base_name="auth-people")
 router.register(r"bypassed-handler-people", BypassedExceptionHandlerPeople,
                 base_name="bypassed-exception-handler-people")
 router.register(r"comments", Comments)
+router.register(r"values-comments", ValuesComments,
+                base_name="values-comment")
 router.register(r"only-comments", OnlyComments, base_name="only-comment")
 router.register(r"valid-lazy-comments", ValidLazyComments,
                 base_name="valid-lazy-comment")
@@ -33,6 +42,15 @@ router.register(r"read-only-author-comments", ReadOnlyAuthorComments,
 router.register(r"formatting", FormattingWithABBRs,
                 base_name="formatting")
 router.register(r"individuals", Individuals)
+router.register(r"categories", Categories)
+router.register(r"budgeted-categories", BudgetedCategories,
+                base_name="budgeted-category")
+router.register(r"streamed-budgeted-categories", StreamedBudgetedCategories,
+                base_name="streamed-budgeted-category")
+router.register(r"posts", Posts)
+router.register(r"private-posts", PrivatePosts, base_name="private-post")
+router.register(r"cursor-posts", CursorPosts, base_name="cursor-post")
+router.register(r"garages", Garages)
 
 urlpatterns = router.urls + [
     url(r"^throttled-view$", throttled_view, name="throttled-view"),
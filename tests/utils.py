@@ -0,0 +1,17 @@
+from __future__ import unicode_literals
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import json
+
+
+def get_json(client, url):
+    """
+    GET `url`, expecting a 200 response. Return the queries run along with
+    the decoded content.
+    """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return context.captured_queries, json.loads(response.content.decode())
@@ -1,4 +1,8 @@
 from rest_framework import viewsets, permissions
+from rest_framework_jsonapi.filters import SortFilter, FieldFilter
+from rest_framework_jsonapi.mixins import (
+    ConditionalGetMixin, IncludeBudgetMixin, PrefetchIncludedMixin,
+    SparseFieldsetsMixin, StreamingListMixin, ValuesListMixin)
 from rest_framework_jsonapi.pagination import (
     PageNumberPagination, LimitOffsetPagination, CursorPagination)
 from rest_framework.decorators import api_view, throttle_classes
@@ -8,13 +12,15 @@ from rest_framework.response import Response
 
 
 from tests.models import (
-    Article, Person, Comment, FormattingWithABBR, Individual)
+    Article, Person, Comment, FormattingWithABBR, Individual, Category, Post,
+    Garage)
 from tests.serializers import (
     ArticleSerializer, PersonSerializer, CommentSerializer,
     ValidLazyCommentSerializer, InvalidLazyCommentSerializer,
     ImproperlyConfiguredReadOnlyAuthorCommentSerializer,
     ReadOnlyAuthorCommentSerializer, OnlyCommentSerializer,
-    FormattingWithABBRSerializer, IndividualSerializer)
+    FormattingWithABBRSerializer, IndividualSerializer, CategorySerializer,
+    ValuesCommentSerializer, PostSerializer, GarageSerializer)
 
 
 class DenyPermission(permissions.BasePermission):
@@ -22,16 +28,40 @@ class DenyPermission(permissions.BasePermission):
         return False
 
 
-class Articles(viewsets.ModelViewSet):
+class Articles(SparseFieldsetsMixin, PrefetchIncludedMixin,
+               viewsets.ModelViewSet):
     queryset = Article.objects.all()
     serializer_class = ArticleSerializer
     pagination_class = PageNumberPagination
+    filter_backends = (FieldFilter, SortFilter)
+    allowed_sorts = ("title", "author.last-name", "author.first-name")
+    allowed_filters = {
+        "id": ("exact", "in"),
+        "title": ("exact", "in", "range"),
+        "author": ("exact", "in"),
+        "author.last-name": ("exact", "in"),
+    }
+
+
+class StreamedArticles(StreamingListMixin, PrefetchIncludedMixin,
+                       viewsets.ModelViewSet):
+    queryset = Article.objects.all()
+    serializer_class = ArticleSerializer
+    pagination_class = None
+    stream_chunk_size = 2
 
 
 class People(viewsets.ModelViewSet):
     queryset = Person.objects.all()
     serializer_class = PersonSerializer
     pagination_class = LimitOffsetPagination
+    filter_backends = (SortFilter,)
+
+
+class StreamedPeople(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Person.objects.all()
+    serializer_class = PersonSerializer
+    pagination_class = LimitOffsetPagination
 
 
 class AuthenticatedPeople(viewsets.ModelViewSet):
@@ -53,6 +83,13 @@ class Comments(viewsets.ModelViewSet):
     pagination_class = CursorPagination
 
 
+class ValuesComments(ValuesListMixin, PrefetchIncludedMixin,
+                     viewsets.ModelViewSet):
+    queryset = Comment.objects.all()
+    serializer_class = ValuesCommentSerializer
+    pagination_class = PageNumberPagination
+
+
 class OnlyComments(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = OnlyCommentSerializer
@@ -83,11 +120,64 @@ class FormattingWithABBRs(viewsets.ModelViewSet):
     serializer_class = FormattingWithABBRSerializer
 
 
-class Individuals(viewsets.ModelViewSet):
+class Individuals(PrefetchIncludedMixin, viewsets.ModelViewSet):
     queryset = Individual.objects.all()
     serializer_class = IndividualSerializer
 
 
+class Categories(viewsets.ModelViewSet):
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    pagination_class = PageNumberPagination
+
+
+class BudgetedCategories(IncludeBudgetMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    pagination_class = PageNumberPagination
+    allowed_includes = ("parent.parent.parent",)
+    max_include_depth = 2
+    max_included = 1
+
+
+class StreamedBudgetedCategories(StreamingListMixin, BudgetedCategories):
+    pass
+
+
+class Posts(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.all()
+    serializer_class = PostSerializer
+    pagination_class = PageNumberPagination
+    filter_backends = (FieldFilter,)
+    allowed_filters = {
+        "published": ("exact",),
+        "created": ("range", "gte"),
+    }
+
+
+class DenyObjectPermission(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return False
+
+
+class PrivatePosts(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.all()
+    serializer_class = PostSerializer
+    permission_classes = (DenyObjectPermission,)
+
+
+class CursorPosts(viewsets.ModelViewSet):
+    queryset = Post.objects.all()
+    serializer_class = PostSerializer
+    pagination_class = CursorPagination
+
+
+class Garages(PrefetchIncludedMixin, viewsets.ModelViewSet):
+    queryset = Garage.objects.all()
+    serializer_class = GarageSerializer
+    pagination_class = PageNumberPagination
+
+
 class AnonImmediateRateThrottle(AnonRateThrottle):
     rate = '0/sec'
     scope = 'seconds'